@@ -0,0 +1,93 @@
+"""Per-frame CPU cost of the audio effects pipeline at N concurrent streams.
+
+Effects run as FFmpeg filter graphs, so the cost is measured as the CPU time
+of N concurrent FFmpeg processes decoding a synthetic track and applying the
+full chain, divided by the number of 20 ms frames produced. The Python-side
+cost of PCMVolumeTransformer (the only per-frame work left in the bot) is
+measured separately. Requires ffmpeg on PATH.
+
+    python benchmarks/audio_effects.py
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.audio_effects import AudioEffects
+
+STREAM_COUNTS = [1, 4, 16]
+TRACK_SECONDS = 30
+FRAME_MS = 20
+FRAMES_PER_TRACK = TRACK_SECONDS * 1000 // FRAME_MS
+# One 20 ms frame of 48 kHz stereo s16le PCM
+FRAME_BYTES = 3840
+
+CHAINS = {
+    'none': AudioEffects(),
+    'volume': AudioEffects(gain_db=-6),
+    'bass+fades': AudioEffects(bass_boost_db=8, crossfade=3),
+    'all effects': AudioEffects(gain_db=-3, normalize=True, bass_boost_db=8, crossfade=3),
+}
+
+
+def ffmpeg_cpu_per_frame(chain: str, streams: int) -> float:
+    # Returns CPU milliseconds per 20 ms frame, averaged over all streams
+    args = [
+        'ffmpeg', '-nostdin', '-loglevel', 'error',
+        '-f', 'lavfi', '-i', f'sine=frequency=220:sample_rate=48000:duration={TRACK_SECONDS}',
+        '-ac', '2',
+    ]
+    if chain:
+        args += ['-filter:a', chain]
+    args += ['-f', 's16le', '-ar', '48000', '-ac', '2', '-']
+
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    processes = [subprocess.Popen(args, stdout=subprocess.DEVNULL) for _ in range(streams)]
+    for process in processes:
+        process.wait()
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return cpu * 1000 / (streams * FRAMES_PER_TRACK)
+
+
+def python_volume_per_frame(rounds: int = 20000) -> float:
+    # What PCMVolumeTransformer does for every frame in pcm mode
+    import discord
+
+    class Frames(discord.AudioSource):
+        frame = b'\x10\x00' * (FRAME_BYTES // 2)
+
+        def read(self):
+            return self.frame
+
+    transformer = discord.PCMVolumeTransformer(Frames(), volume=0.5)
+    start = time.process_time()
+    for _ in range(rounds):
+        transformer.read()
+    return (time.process_time() - start) * 1000 / rounds
+
+
+def main():
+    if shutil.which('ffmpeg') is None:
+        print("ffmpeg not found on PATH")
+        return
+
+    print(f"CPU ms per {FRAME_MS} ms frame (budget: {FRAME_MS} ms per stream, all streams share the cores)")
+    print(f"{'chain':>12} " + " ".join(f"{f'{n} streams':>11}" for n in STREAM_COUNTS))
+    for name, effects in CHAINS.items():
+        chain = effects.filter_chain(1.0, TRACK_SECONDS)
+        costs = [ffmpeg_cpu_per_frame(chain, n) for n in STREAM_COUNTS]
+        print(f"{name:>12} " + " ".join(f"{cost:>8.3f} ms" for cost in costs))
+
+    try:
+        print(f"\nPython PCMVolumeTransformer: {python_volume_per_frame():.4f} ms per frame")
+    except Exception as e:
+        print(f"\nPython PCMVolumeTransformer: not measured ({e})")
+
+
+if __name__ == "__main__":
+    main()
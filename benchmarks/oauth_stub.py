@@ -0,0 +1,258 @@
+"""Local stand-in for Discord's OAuth2 endpoints, plus a login-burst benchmark.
+
+Serve the stub and point the dashboard at it:
+
+    python benchmarks/oauth_stub.py --port 5055
+    DISCORD_API_ENDPOINT=http://127.0.0.1:5055 python run.py
+
+(submit any client id/secret on /login, then open /callback?code=anything)
+
+Or compare the pooled client with one-off requests calls under a burst of
+logins handled by 4 worker threads, like the default Waitress setup:
+
+    python benchmarks/oauth_stub.py --bench 200 --latency 0.05 --fail-rate 0.1
+
+Or check DiscordOAuthClient's sync and async paths against it (success,
+caching, retries, and no retry of the single-use token exchange):
+
+    python benchmarks/oauth_stub.py --check
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import aiohttp
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.discord_oauth import DiscordOAuthClient
+
+WORKER_THREADS = 4
+
+
+def make_handler(latency: float, fail_rate: float, hang_rate: float):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body go out as separate writes; without this, keep-alive
+        # connections stall on delayed ACKs and the comparison is meaningless
+        disable_nagle_algorithm = True
+        connections = 0
+        # Requests seen per method, and scripted 503s still to send (--check)
+        requests = Counter()
+        forced_failures = Counter()
+
+        def setup(self):
+            super().setup()
+            StubHandler.connections += 1
+
+        def log_message(self, format, *args):
+            pass
+
+        def _reply(self, status, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _misbehave(self) -> bool:
+            StubHandler.requests[self.command] += 1
+            if StubHandler.forced_failures[self.command] > 0:
+                StubHandler.forced_failures[self.command] -= 1
+                self._reply(503, {'message': 'Service Unavailable'})
+                return True
+            roll = random.random()
+            if roll < hang_rate:
+                # Longer than any sane client timeout
+                time.sleep(30)
+                return True
+            time.sleep(latency)
+            if roll < hang_rate + fail_rate:
+                self._reply(503, {'message': 'Service Unavailable'})
+                return True
+            return False
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            body = self.rfile.read(length).decode('utf-8')
+            if self.path.rstrip('/').endswith('/oauth2/token'):
+                if self._misbehave():
+                    return
+                code = dict(pair.split('=', 1) for pair in body.split('&') if '=' in pair).get('code', 'code')
+                self._reply(200, {'access_token': f'token-{code}', 'token_type': 'Bearer', 'expires_in': 604800})
+            else:
+                self._reply(404, {'message': 'Not Found'})
+
+        def do_GET(self):
+            if self.path.rstrip('/').endswith('/users/@me'):
+                if self._misbehave():
+                    return
+                token = self.headers.get('Authorization', '').replace('Bearer ', '')
+                user_id = str(abs(hash(token)) % 10 ** 18)
+                self._reply(200, {'id': user_id, 'username': f'user{user_id[:4]}', 'avatar': None})
+            else:
+                self._reply(404, {'message': 'Not Found'})
+
+    return StubHandler
+
+
+def login_pooled(client: DiscordOAuthClient, code: str):
+    tokens = client.exchange_code('id', 'secret', code, 'http://localhost/callback')
+    return client.get_user(tokens['access_token'])
+
+
+def login_unpooled(endpoint: str, code: str):
+    # The original callback: module-level requests calls, no timeout, no retries
+    r = requests.post(f'{endpoint}/oauth2/token', data=DiscordOAuthClient.token_payload('id', 'secret', code, 'http://localhost/callback'))
+    r.raise_for_status()
+    r_user = requests.get(f'{endpoint}/users/@me', headers={'Authorization': f"Bearer {r.json()['access_token']}"})
+    r_user.raise_for_status()
+    return r_user.json()
+
+
+def run_burst(name, login, logins: int, handler):
+    before = handler.connections
+    failures = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WORKER_THREADS) as pool:
+        futures = [pool.submit(login, f'{name}-{i}') for i in range(logins)]
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                failures += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:>9}: {logins / elapsed:7.1f} logins/s, {failures:4d} failed, "
+          f"{handler.connections - before:4d} TCP connections")
+
+
+def expect(condition: bool, message: str):
+    if not condition:
+        raise AssertionError(message)
+    print(f"  ok  {message}")
+
+
+def check_sync(client: DiscordOAuthClient, handler):
+    handler.requests.clear()
+    tokens = client.exchange_code('id', 'secret', 'sync', 'http://localhost/callback')
+    expect(tokens['access_token'] == 'token-sync', "exchange_code returns the token")
+    user = client.get_user(tokens['access_token'])
+    expect(user['username'].startswith('user'), "get_user returns the user")
+    client.get_user(tokens['access_token'])
+    expect(handler.requests['GET'] == 1, "a repeated get_user is served from the cache")
+
+    handler.requests.clear()
+    handler.forced_failures['GET'] = 2
+    client.get_user('token-retried')
+    expect(handler.requests['GET'] == 3, "get_user retries 503s")
+
+    handler.requests.clear()
+    handler.forced_failures['POST'] = 1
+    try:
+        client.exchange_code('id', 'secret', 'once', 'http://localhost/callback')
+    except requests.HTTPError:
+        pass
+    else:
+        expect(False, "exchange_code raises on 503")
+    expect(handler.requests['POST'] == 1, "exchange_code is not retried (codes are single-use)")
+
+
+async def check_async(client: DiscordOAuthClient, handler):
+    handler.requests.clear()
+    tokens = await client.exchange_code_async('id', 'secret', 'async', 'http://localhost/callback')
+    expect(tokens['access_token'] == 'token-async', "exchange_code_async returns the token")
+    user = await client.get_user_async(tokens['access_token'])
+    expect(user['username'].startswith('user'), "get_user_async returns the user")
+    await client.get_user_async(tokens['access_token'])
+    expect(handler.requests['GET'] == 1, "a repeated get_user_async is served from the cache")
+
+    handler.requests.clear()
+    handler.forced_failures['GET'] = 2
+    await client.get_user_async('token-retried-async')
+    expect(handler.requests['GET'] == 3, "get_user_async retries 503s")
+
+    handler.requests.clear()
+    handler.forced_failures['GET'] = client.retries + 1
+    try:
+        await client.get_user_async('token-failing')
+    except aiohttp.ClientResponseError:
+        pass
+    else:
+        expect(False, "get_user_async raises once retries run out")
+    expect(handler.requests['GET'] == client.retries + 1, "get_user_async gives up after its retries")
+
+    handler.requests.clear()
+    handler.forced_failures['POST'] = 1
+    try:
+        await client.exchange_code_async('id', 'secret', 'once', 'http://localhost/callback')
+    except aiohttp.ClientResponseError:
+        pass
+    else:
+        expect(False, "exchange_code_async raises on 503")
+    expect(handler.requests['POST'] == 1, "exchange_code_async is not retried (codes are single-use)")
+    await client.close_async()
+
+
+def run_checks(server, handler, endpoint):
+    client = DiscordOAuthClient(endpoint, pool_size=WORKER_THREADS)
+    print("sync client")
+    check_sync(client, handler)
+    print("async client")
+    asyncio.run(check_async(client, handler))
+    client.close()
+    server.shutdown()
+    print("all checks passed")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to every response")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument('--hang-rate', type=float, default=0.0, help="fraction of requests that hang for 30s")
+    parser.add_argument('--bench', type=int, default=0, metavar='LOGINS', help="run a login burst instead of serving")
+    parser.add_argument('--check', action='store_true', help="check DiscordOAuthClient against the stub and exit")
+    args = parser.parse_args()
+
+    if args.check:
+        # Deterministic: no random failures, any free port
+        handler = make_handler(0, 0, 0)
+        server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        # Clients closing their keep-alive connections at the end is expected
+        server.handle_error = lambda request, client_address: None
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        run_checks(server, handler, f'http://127.0.0.1:{server.server_address[1]}')
+        return
+
+    handler = make_handler(args.latency, args.fail_rate, args.hang_rate)
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), handler)
+    server.daemon_threads = True
+    endpoint = f'http://127.0.0.1:{args.port}'
+    if not args.bench:
+        print(f"Discord OAuth stub on {endpoint}")
+        server.serve_forever()
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    if args.hang_rate:
+        print("note: unpooled logins have no timeout and will stall on hung requests")
+    client = DiscordOAuthClient(endpoint, pool_size=WORKER_THREADS)
+    run_burst('pooled', lambda code: login_pooled(client, code), args.bench, handler)
+    if not args.hang_rate:
+        run_burst('unpooled', lambda code: login_unpooled(endpoint, code), args.bench, handler)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
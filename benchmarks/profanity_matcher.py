@@ -0,0 +1,80 @@
+"""Messages/sec of the profanity check against word lists of growing size.
+
+Compares the original check (lower-case the message once per term and test
+substring membership) with utils.profanity.ProfanityMatcher, on a synthetic
+chat corpus where a few percent of messages contain a listed term.
+
+    python benchmarks/profanity_matcher.py
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.profanity import ProfanityMatcher
+
+TERM_COUNTS = [10, 100, 1000, 5000, 20000]
+MESSAGES = 5000
+HIT_RATE = 0.03
+# Keeps the slow path from running for minutes on the large lists
+NAIVE_BUDGET = 3.0
+
+
+def random_word(rng, low=3, high=10):
+    return ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(low, high)))
+
+
+def make_corpus(rng, terms):
+    messages = []
+    for _ in range(MESSAGES):
+        words = [random_word(rng) for _ in range(rng.randint(3, 30))]
+        if rng.random() < HIT_RATE:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(terms).upper())
+        messages.append(' '.join(words).capitalize() + rng.choice(['', '.', '!', '?']))
+    return messages
+
+
+def naive_check(terms, content):
+    # The original Moderation.on_message loop
+    for term in terms:
+        if term.lower() in content.lower():
+            return term
+    return None
+
+
+def measure(check, messages, budget=None):
+    hits = 0
+    checked = 0
+    start = time.perf_counter()
+    for message in messages:
+        if check(message):
+            hits += 1
+        checked += 1
+        if budget and time.perf_counter() - start > budget:
+            break
+    elapsed = time.perf_counter() - start
+    return checked / elapsed, hits, checked
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'terms':>6} {'build ms':>9} {'naive msg/s':>12} {'matcher msg/s':>14} {'speedup':>8}")
+    for count in TERM_COUNTS:
+        terms = list({random_word(rng, 4, 12) for _ in range(count)})
+        messages = make_corpus(rng, terms)
+
+        start = time.perf_counter()
+        matcher = ProfanityMatcher(terms)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        naive_rate, _, _ = measure(lambda message: naive_check(terms, message), messages, NAIVE_BUDGET)
+        matcher_rate, hits, checked = measure(matcher.search, messages)
+        print(f"{len(terms):>6} {build_ms:>9.1f} {naive_rate:>12.0f} {matcher_rate:>14.0f} "
+              f"{matcher_rate / naive_rate:>7.1f}x  ({hits}/{checked} flagged)")
+
+
+if __name__ == "__main__":
+    main()
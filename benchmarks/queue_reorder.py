@@ -0,0 +1,100 @@
+"""Cost of reordering a guild's queue versus queue length.
+
+Compares the old one-UPDATE-per-row shuffle with the path reorders take
+now: QueueStore.shuffle/sort/move_range update the in-memory queue and
+the flush writes the new positions as one executemany in one transaction.
+Each QueueStore timing includes that flush.
+
+    python benchmarks/queue_reorder.py
+"""
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from utils.database import DatabaseManager, POSITION_STEP
+from utils.queue_store import QueueStore
+
+LENGTHS = [10, 100, 500, 2000]
+ROUNDS = 20
+GUILD_ID = 1
+COLUMNS = ('legacy per-row', 'shuffle', 'sort', 'move_range')
+
+
+def legacy_shuffle(db_path, guild_id):
+    # The original shuffle_queue: fresh connection, one UPDATE per row
+    connection = sqlite3.connect(db_path)
+    cursor = connection.cursor()
+    cursor.execute("SELECT id FROM music_queue WHERE guild_id = ? ORDER BY position ASC", (guild_id,))
+    ids = [row[0] for row in cursor.fetchall()]
+    random.shuffle(ids)
+    for index, row_id in enumerate(ids):
+        cursor.execute("UPDATE music_queue SET position = ? WHERE id = ?", (index + 1, row_id))
+    connection.commit()
+    connection.close()
+
+
+async def timed(fn, rounds=ROUNDS):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await fn()
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+async def bench(length):
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, 'bench.db')
+    db = DatabaseManager(db_path)
+    # A few other guilds share the table, as in production
+    with sqlite3.connect(db_path) as connection:
+        connection.executemany(
+            "INSERT INTO music_queue (guild_id, title, duration, requester, position) VALUES (?, ?, ?, ?, ?)",
+            [(guild_id, f"track {i}", random.randint(60, 600), f"user{i % 7}", (i + 1) * POSITION_STEP)
+             for guild_id in (GUILD_ID, 2, 3, 4) for i in range(length)]
+        )
+    # No flush task; each timing flushes explicitly
+    store = QueueStore(db)
+    await store.load()
+
+    loop = asyncio.get_running_loop()
+
+    async def legacy():
+        await loop.run_in_executor(None, legacy_shuffle, db_path, GUILD_ID)
+
+    async def shuffle():
+        store.shuffle(GUILD_ID)
+        await store.flush()
+
+    async def sort():
+        # Alternate keys so every round actually moves items
+        store.sort(GUILD_ID, random.choice(['duration', 'requester']))
+        await store.flush()
+
+    async def move_range():
+        store.move_range(GUILD_ID, random.randrange(length), max(1, length // 10), random.randrange(length))
+        await store.flush()
+
+    results = {
+        'legacy per-row': await timed(legacy),
+        'shuffle': await timed(shuffle),
+        'sort': await timed(sort),
+        'move_range': await timed(move_range),
+    }
+    db.close()
+    return results
+
+
+async def main():
+    print(f"{'tracks':>7} " + " ".join(f"{name:>18}" for name in COLUMNS))
+    for length in LENGTHS:
+        results = await bench(length)
+        print(f"{length:>7} " + " ".join(f"{ms:>15.2f} ms" for ms in results.values()))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -6,13 +6,15 @@ from dotenv import load_dotenv
 # Load environment variables early
 load_dotenv()
 
-from src.web import app as flask_app  # Import our new web module
-
-# Add the 'src' directory to the Python path
+# Add the 'src' directory to the Python path (the web module imports from utils)
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
+# Everything else is imported under the guard: voice workers are spawned
+# processes, which re-run this module as __mp_main__ and must not build the
+# web app, its OAuth client and metrics, or the bot
 if __name__ == "__main__":
-    from src.main import bot, TOKEN
+    from src.web import app as flask_app  # Import our new web module
+    from src.main import bot, db_manager, TOKEN
     
     # Inject the bot instance into the Flask app
     flask_app.bot = bot
@@ -20,11 +22,46 @@ if __name__ == "__main__":
     # Get port from environment
     port = int(os.environ.get('PORT', 5000))
     
+    if os.getenv('WEB_MODE', 'threaded').lower() == 'async':
+        # Bot and dashboard share one event loop on the main thread
+        import asyncio
+        import discord
+        from src.web import async_app
+
+        # bot.run() sets up discord.py's logging itself; bot.start() does not
+        discord.utils.setup_logging()
+
+        if not TOKEN:
+            print("Error: DISCORD_TOKEN not found in environment.")
+        else:
+            print("Starting Discord Bot...")
+        print(f"Starting Web Dashboard on port {port}")
+        try:
+            asyncio.run(async_app.run_with_bot(bot, TOKEN, port))
+        finally:
+            # After the bot closed and its cogs flushed their stores
+            db_manager.close()
+        sys.exit(0)
+
+    # The bot thread is a daemon and would die with the process, so on
+    # Ctrl+C or `docker stop` close it on its own loop first
+    import signal
+    from src.main import close_bot_threadsafe
+
+    def shutdown(signum, frame):
+        print("Shutting down, saving state...")
+        close_bot_threadsafe()
+        # Stops the web server too
+        sys.exit(0)
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
     # Start Discord Bot in a separate thread
     if not TOKEN:
         print("Error: DISCORD_TOKEN not found in environment.")
     else:
-        print(f"Starting Discord Bot...")
+        print("Starting Discord Bot...")
         bot_thread = threading.Thread(target=bot.run, args=(TOKEN,), daemon=True)
         bot_thread.start()
     
@@ -1,38 +1,307 @@
+import asyncio
+import time
+from collections import defaultdict
+from datetime import timedelta
 import discord
+from discord import app_commands
 from discord.ext import commands
 from utils.database import DatabaseManager
+from utils.metrics import REGISTRY
+from utils.profanity import ProfanityMatcher, normalize
+from utils.spam import DuplicateDetector, SlidingWindowCounter
+from utils.strike_counter import StrikeCounter
+from utils.tracing import span, trace
+
+# Limits for the per-guild custom word lists
+MAX_CUSTOM_TERMS = 5000
+MAX_TERM_LENGTH = 64
+MAX_WARNINGS = 3
+# A member sending more than this many messages within the window is flooding
+FLOOD_LIMIT = 8
+FLOOD_WINDOW = 5.0
+# The same message this many times from a member in a channel within the
+# window is spam (looking at most DUPLICATE_HISTORY messages back)
+DUPLICATE_WINDOW = 60.0
+DUPLICATE_THRESHOLD = 3
+DUPLICATE_HISTORY = 50
+# Spam strikes are counted apart from profanity warnings, in memory only.
+# Spam is never a ban: reaching this many within the window times the
+# member out for SPAM_TIMEOUT seconds.
+MAX_SPAM_STRIKES = 5
+SPAM_STRIKE_WINDOW = 600.0
+SPAM_TIMEOUT = 600
+# Violations are collected this long, then acted on together
+BATCH_INTERVAL = 1.0
+# The bot's own replies per channel; more warnings wait for the next free slot
+REPLY_LIMIT = 2
+REPLY_WINDOW = 10.0
+# Discord's bulk delete takes at most this many messages
+BULK_DELETE_LIMIT = 100
+
+# Evaluating a message takes microseconds, so finer buckets than the default
+MESSAGE_SECONDS = REGISTRY.histogram(
+    'mozart_moderation_message_seconds', "Time on_message spends checking a message",
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+)
+VIOLATIONS = REGISTRY.counter('mozart_moderation_violations_total', "Messages acted on, by reason", ['reason'])
+BATCH_SECONDS = REGISTRY.histogram('mozart_moderation_batch_seconds', "Time to act on one batch of violations")
 
 class Moderation(commands.Cog):
+    profanity_group = app_commands.Group(
+        name="profanity",
+        description="Manage this server's blocked words.",
+        guild_only=True,
+        default_permissions=discord.Permissions(manage_messages=True)
+    )
+
     def __init__(self, bot, db_manager: DatabaseManager):
         self.bot = bot
         self.db = db_manager
+        self.strikes = StrikeCounter(db_manager)
         self.profanity = ["fuck you", "nigga"]
+        # Built once; guilds without custom words share the default matcher
+        self.default_matcher = ProfanityMatcher(self.profanity)
+        self.custom_terms = {}
+        self.matchers = {}
+        self.message_rates = SlidingWindowCounter(FLOOD_LIMIT, FLOOD_WINDOW)
+        self.duplicates = DuplicateDetector(DUPLICATE_WINDOW, DUPLICATE_THRESHOLD, DUPLICATE_HISTORY)
+        self.spam_strikes = SlidingWindowCounter(MAX_SPAM_STRIKES, SPAM_STRIKE_WINDOW)
+        self.reply_rates = SlidingWindowCounter(REPLY_LIMIT, REPLY_WINDOW)
+        # Per guild: (message, reason) pairs awaiting action, the task acting
+        # on them, and {channel: {member_id: line}} replies not yet sent
+        self.violations = defaultdict(list)
+        self.workers = {}
+        self.pending_replies = {}
+
+    async def cog_load(self):
+        self.strikes.start()
+        self.custom_terms = await self.db.load_profanity_terms()
+        for guild_id in self.custom_terms:
+            await self.rebuild_matcher(guild_id)
+
+    async def cog_unload(self):
+        for worker in self.workers.values():
+            worker.cancel()
+        # Write out strikes still held in memory
+        await self.strikes.close()
+
+    async def rebuild_matcher(self, guild_id: int):
+        terms = self.custom_terms.get(guild_id)
+        if not terms:
+            self.matchers.pop(guild_id, None)
+            return
+        # Compiling thousands of terms takes a while, keep it off the loop
+        snapshot = dict(terms)
+        matcher = await asyncio.to_thread(
+            ProfanityMatcher,
+            self.default_matcher.terms | {term for term, whole_word in snapshot.items() if not whole_word},
+            {term for term, whole_word in snapshot.items() if whole_word}
+        )
+        # A newer edit started its own rebuild meanwhile; let that one win
+        if self.custom_terms.get(guild_id) == snapshot:
+            self.matchers[guild_id] = matcher
+
+    def get_matcher(self, guild_id: int) -> ProfanityMatcher:
+        return self.matchers.get(guild_id, self.default_matcher)
+
+    @staticmethod
+    def parse_terms(words: str):
+        # Comma-separated input, normalized the same way messages are
+        terms = {normalize(word) for word in words.split(',')}
+        return {term for term in terms if term and len(term) <= MAX_TERM_LENGTH}
+
+    def evaluate(self, msg):
+        # Cheap, synchronous checks; returns why msg breaks the rules, or None
+        now = time.monotonic()
+        # Counted first so a flood made of profanity still counts as one
+        flooding = self.message_rates.hit((msg.guild.id, msg.author.id), now) > FLOOD_LIMIT
+        duplicate = self.duplicates.is_duplicate((msg.channel.id, msg.author.id), msg.content, now)
+        if self.get_matcher(msg.guild.id).search(msg.content):
+            return 'profanity'
+        if flooding:
+            return 'flooding'
+        if duplicate:
+            return 'duplicate messages'
+        return None
 
     @commands.Cog.listener()
     async def on_message(self, msg):
         if msg.author.bot or not msg.guild:
             return
 
-        # Check for profanity
-        for term in self.profanity:
-            if term.lower() in msg.content.lower():
-                num_warnings = await self.db.increase_and_get_warnings(msg.author.id, msg.guild.id)
-                
-                if num_warnings >= 3:
-                    try:
-                        await msg.author.ban(reason="Exceeded 3 strikes for using profanity.")
-                        await msg.channel.send(f"{msg.author.mention} has been banned for repeated profanity.")
-                    except discord.Forbidden:
-                        await msg.channel.send("I tried to ban the user but I lack permissions.")
-                    except discord.HTTPException as e:
-                        await msg.channel.send(f"Failed to ban user: {e}")
-                    
-                else:
-                    await msg.channel.send(
-                        f"Warning {num_warnings}/3 {msg.author.mention}. If you reach 3 warnings, you will be banned."
-                    )
+        with MESSAGE_SECONDS.time():
+            reason = self.evaluate(msg)
+        if reason is None:
+            return
+        VIOLATIONS.inc(reason)
+        # Acted on by the guild's worker, so a raid never stalls this listener
+        self.violations[msg.guild.id].append((msg, reason))
+        worker = self.workers.get(msg.guild.id)
+        if worker is None or worker.done():
+            self.workers[msg.guild.id] = asyncio.create_task(self.process_violations(msg.guild.id))
+
+    async def process_violations(self, guild_id: int):
+        while self.violations.get(guild_id) or self.pending_replies.get(guild_id):
+            await asyncio.sleep(BATCH_INTERVAL)
+            batch = self.violations.pop(guild_id, [])
+            try:
+                with BATCH_SECONDS.time(), trace('moderation_batch', root=True, guild=guild_id, size=len(batch)):
+                    await self.handle_batch(guild_id, batch)
+            except Exception as e:
+                print(f"Moderation batch for guild {guild_id} failed: {e}")
+        self.workers.pop(guild_id, None)
+
+    async def handle_batch(self, guild_id: int, batch):
+        to_delete = defaultdict(list)
+        # Spam is one strike per member per batch, profanity one per message
+        spam_struck = set()
+        # Banned or timed out in this batch; their other messages are only deleted
+        removed = set()
+        replies = self.pending_replies.setdefault(guild_id, {})
+
+        for msg, reason in batch:
+            to_delete[msg.channel].append(msg)
+            member = msg.author
+            if member.id in removed or (reason != 'profanity' and member.id in spam_struck):
+                continue
+            # A newer line for the same member replaces the older one
+            lines = replies.setdefault(msg.channel, {})
+
+            if reason == 'profanity':
+                num_warnings = await self.strikes.increment(guild_id, member.id)
+                if num_warnings < MAX_WARNINGS:
+                    lines[member.id] = f"⚠️ {member.mention} warning {num_warnings}/{MAX_WARNINGS} for {reason}."
+                    continue
+                removed.add(member.id)
+                try:
+                    await member.ban(reason=f"Exceeded {MAX_WARNINGS} strikes ({reason}).")
+                    lines[member.id] = f"🔨 {member.mention} has been banned for repeated {reason}."
+                except discord.Forbidden:
+                    lines[member.id] = f"I tried to ban {member.mention} but I lack permissions."
+                except discord.HTTPException as e:
+                    lines[member.id] = f"Failed to ban {member.mention}: {e}"
+                continue
+
+            spam_struck.add(member.id)
+            num_strikes = self.spam_strikes.hit((guild_id, member.id), time.monotonic())
+            if num_strikes < MAX_SPAM_STRIKES:
+                lines[member.id] = f"⚠️ {member.mention} slow down: {reason} ({num_strikes}/{MAX_SPAM_STRIKES})."
+                continue
+            removed.add(member.id)
+            try:
+                await member.timeout(timedelta(seconds=SPAM_TIMEOUT), reason=f"Repeated {reason}.")
+                lines[member.id] = (
+                    f"⏳ {member.mention} has been timed out for {SPAM_TIMEOUT // 60} minutes for repeated {reason}."
+                )
+            except discord.Forbidden:
+                lines[member.id] = f"I tried to time out {member.mention} but I lack permissions."
+            except discord.HTTPException as e:
+                lines[member.id] = f"Failed to time out {member.mention}: {e}"
+
+        with span('delete', channels=len(to_delete)):
+            for channel, messages in to_delete.items():
+                await self.delete_messages(channel, messages)
+        with span('replies'):
+            await self.send_replies(guild_id)
+
+    @staticmethod
+    async def delete_messages(channel, messages):
+        # One bulk delete request per 100 messages instead of one each
+        for start in range(0, len(messages), BULK_DELETE_LIMIT):
+            chunk = messages[start:start + BULK_DELETE_LIMIT]
+            try:
+                await channel.delete_messages(chunk)
+            except discord.Forbidden:
+                return # Ignore if we can't delete
+            except discord.HTTPException:
+                # e.g. a message was already deleted, or is too old to bulk delete
+                for msg in chunk:
                     try:
                         await msg.delete()
-                    except discord.Forbidden:
-                        pass # Ignore if we can't delete
-                break # Stop checking other terms if one is found
+                    except discord.HTTPException:
+                        pass
+
+    async def send_replies(self, guild_id: int):
+        # Every channel gets at most one message per batch, and at most
+        # REPLY_LIMIT per REPLY_WINDOW; the rest waits for the next batch
+        replies = self.pending_replies.get(guild_id, {})
+        now = time.monotonic()
+        for channel in list(replies):
+            if not self.reply_rates.allow(channel.id, now):
+                continue
+            lines = list(replies.pop(channel).values())
+            content = ""
+            for index, line in enumerate(lines):
+                if len(content) + len(line) > 1800:
+                    content += f"...and {len(lines) - index} more."
+                    break
+                content += line + "\n"
+            content += (
+                f"Members reaching {MAX_WARNINGS} profanity warnings are banned; "
+                f"{MAX_SPAM_STRIKES} spam warnings within {SPAM_STRIKE_WINDOW / 60:.0f} minutes mean a timeout."
+            )
+            try:
+                await channel.send(content)
+            except discord.HTTPException:
+                pass
+        if not replies:
+            self.pending_replies.pop(guild_id, None)
+
+    @profanity_group.command(name="add", description="Block one or more words (comma-separated).")
+    @app_commands.describe(
+        words="e.g. word, another word",
+        whole_word="only match the exact word, not words starting with it (e.g. for short words)"
+    )
+    async def profanity_add(self, interaction: discord.Interaction, words: str, whole_word: bool = False):
+        terms = self.parse_terms(words)
+        if not terms:
+            await interaction.response.send_message(
+                f"No valid words given (each must be 1-{MAX_TERM_LENGTH} characters).", ephemeral=True
+            )
+            return
+        current = self.custom_terms.setdefault(interaction.guild_id, {})
+        terms = {term for term in terms if current.get(term) != whole_word}
+        if not terms:
+            await interaction.response.send_message("Those words are already blocked.", ephemeral=True)
+            return
+        if len(current) + len(terms - current.keys()) > MAX_CUSTOM_TERMS:
+            await interaction.response.send_message(
+                f"This server can block at most {MAX_CUSTOM_TERMS} custom words.", ephemeral=True
+            )
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        await self.db.add_profanity_terms(interaction.guild_id, terms, whole_word)
+        current.update(dict.fromkeys(terms, whole_word))
+        await self.rebuild_matcher(interaction.guild_id)
+        await interaction.followup.send(f"Blocked {len(terms)} new or updated word(s).", ephemeral=True)
+
+    @profanity_group.command(name="remove", description="Unblock one or more words (comma-separated).")
+    @app_commands.describe(words="e.g. word, another word")
+    async def profanity_remove(self, interaction: discord.Interaction, words: str):
+        current = self.custom_terms.get(interaction.guild_id, {})
+        terms = self.parse_terms(words) & current.keys()
+        if not terms:
+            await interaction.response.send_message("None of those words are on this server's list.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        await self.db.remove_profanity_terms(interaction.guild_id, terms)
+        for term in terms:
+            del current[term]
+        await self.rebuild_matcher(interaction.guild_id)
+        await interaction.followup.send(f"Unblocked {len(terms)} word(s).", ephemeral=True)
+
+    @profanity_group.command(name="list", description="Show this server's custom blocked words.")
+    async def profanity_list(self, interaction: discord.Interaction):
+        terms = sorted(self.custom_terms.get(interaction.guild_id, {}).items())
+        if not terms:
+            await interaction.response.send_message("No custom words are blocked on this server.", ephemeral=True)
+            return
+        # Whole-word terms are marked with an asterisk
+        listing = ", ".join(f"||{term}||{'*' if whole_word else ''}" for term, whole_word in terms)
+        if len(listing) > 1900:
+            listing = listing[:1900].rsplit(", ", 1)[0] + ", ..."
+        await interaction.response.send_message(
+            f"{len(terms)} custom word(s): {listing}", ephemeral=True
+        )
@@ -1,11 +1,52 @@
 import discord
 from discord import app_commands
 from discord.ext import commands
-import yt_dlp
 import asyncio
 import random
 import os
-from typing import Any, Dict, List, Optional
+import time
+import shlex
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional
+from utils.queue_store import QueueStore
+from utils.extraction_cache import ExtractionCache, SEARCH_TTL, normalize_key, stream_url_expiry
+from utils.scheduler import BlockingScheduler
+from utils.ytdl_pool import PROFILES, YoutubeDLPool
+from utils.audio_effects import AudioEffects, MAX_BASS_BOOST_DB, MAX_CROSSFADE, MAX_GAIN_DB
+from utils.player import GuildPlayer, PlayerEvent
+from utils.state_feed import StateFeed
+from utils.voice_workers import VoiceWorkerPool, WorkerAudioSource, build_source
+from utils.metrics import REGISTRY
+from utils.tracing import span, trace
+
+# Playlist import: how many entries are enqueued at most
+MAX_PLAYLIST_TRACKS = 200
+# yt-dlp worker threads shared by all guilds, and how many of them a single
+# guild may occupy at once (its playlist import included)
+EXTRACTION_WORKERS = 8
+PER_GUILD_EXTRACTIONS = 3
+# Minimum seconds between progress edits of the /playlist response
+PLAYLIST_PROGRESS_INTERVAL = 1.0
+# A stream URL is only used (or cached) if it stays valid this long past the
+# track's duration (FFmpeg reconnects re-use the same URL)
+STREAM_URL_EXPIRY_MARGIN = 60
+# How often the extraction cache is written to disk when persistence is on
+EXTRACTION_CACHE_SAVE_INTERVAL = 5 * 60
+
+# Playback modes: "pcm" decodes in FFmpeg, scales volume in Python and encodes
+# Opus in the bot; "opus" has FFmpeg output Opus directly (volume applied
+# there), or just remux when the source already is Opus at 100% volume
+AUDIO_MODES = ('pcm', 'opus')
+DEFAULT_VOLUMES = {'pcm': 0.5, 'opus': 1.0}
+COMMAND_SECONDS = REGISTRY.histogram('mozart_command_seconds', "Time to handle a slash command", ['command'])
+EXTRACTION_SECONDS = REGISTRY.histogram('mozart_extraction_seconds', "yt-dlp extraction time on a worker thread", ['kind'])
+STREAM_LOOKUPS = REGISTRY.counter('mozart_stream_lookups_total', "Stream URL lookups by where the answer came from", ['result'])
+TRACK_START_SECONDS = REGISTRY.histogram(
+    'mozart_track_start_seconds', "Time from the player asking for the next track to audio starting", ['source']
+)
+TRACK_STARTS = REGISTRY.counter('mozart_track_starts_total', "Attempts to start the next track by outcome", ['result'])
+
+FFMPEG_STREAM_OPTIONS = '-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -protocol_whitelist file,http,https,tcp,tls'
 
 class MusicControls(discord.ui.View):
     def __init__(self, bot, voice_client):
@@ -22,12 +63,16 @@ class MusicControls(discord.ui.View):
 
         if self.voice_client.is_playing():
             self.voice_client.pause()
+            if self.music_cog:
+                self.music_cog.publish_state(self.voice_client.guild.id)
             button.label = "Resume"
             button.emoji = "▶️"
             button.style = discord.ButtonStyle.success
             await interaction.response.edit_message(view=self)
         elif self.voice_client.is_paused():
             self.voice_client.resume()
+            if self.music_cog:
+                self.music_cog.publish_state(self.voice_client.guild.id)
             button.label = "Pause"
             button.emoji = "⏸️"
             button.style = discord.ButtonStyle.secondary
@@ -42,7 +87,10 @@ class MusicControls(discord.ui.View):
             return
             
         if self.voice_client.is_playing() or self.voice_client.is_paused():
-            self.voice_client.stop()
+            if self.music_cog:
+                self.music_cog.skip_track(self.voice_client.guild.id)
+            else:
+                self.voice_client.stop()
             await interaction.response.send_message("Skipped.", ephemeral=True)
         else:
              await interaction.response.send_message("Nothing to skip.", ephemeral=True)
@@ -54,6 +102,7 @@ class MusicControls(discord.ui.View):
             guild_id = self.voice_client.guild.id
             if self.music_cog:
                 await self.music_cog.clear_state(guild_id)
+                await self.music_cog.stop_player(guild_id)
             
             self.voice_client.stop()
             await self.voice_client.disconnect()
@@ -111,209 +160,565 @@ class MusicControls(discord.ui.View):
 
 
 class Music(commands.Cog):
-    def __init__(self, bot, db_manager, download_dir=None):
+    def __init__(self, bot, db_manager, download_dir=None, extraction_cache=None, audio_cache=None, audio_mode='pcm', voice_workers=0):
         self.bot = bot
         self.db = db_manager
-        # self.queues removed in favor of DB
+        if audio_mode not in AUDIO_MODES:
+            raise ValueError(f"Unknown audio mode: {audio_mode}")
+        self.audio_mode = audio_mode
+        # Worker processes for playback (None: play in this process)
+        self.voice_workers = VoiceWorkerPool(voice_workers) if voice_workers > 0 else None
+        # Shared across guilds: the same query or URL is only extracted once per TTL
+        self.extraction_cache = extraction_cache or ExtractionCache()
+        self.cache_save_task: Optional[asyncio.Task] = None
+        # Local Opus copies of popular tracks (lives in download_dir)
+        self.audio_cache = audio_cache
+        # Reused YoutubeDL instances, one set per option profile
+        self.ytdl_pool = YoutubeDLPool({
+            **PROFILES,
+            # Flat extraction only lists the entries (one request per page of
+            # the playlist) instead of resolving every video up front
+            'playlist': {
+                'extract_flat': 'in_playlist',
+                'playlistend': MAX_PLAYLIST_TRACKS,
+                'quiet': True,
+                'no_warnings': True,
+                'nocheckcertificate': True,
+            },
+        })
+        # Queues are served from memory and written behind to the DB
+        self.queues = QueueStore(db_manager)
         self.current_songs: Dict[int, Dict] = {}
         self.loop_states: Dict[int, bool] = {} 
         self.volumes: Dict[int, float] = {} # Store volume per guild (0.0 - 1.0)
+        self.effects: Dict[int, AudioEffects] = {} # FFmpeg filter settings per guild
+        # All yt-dlp work runs here rather than on the loop's default
+        # executor; database work has its own pools in DatabaseManager
+        self.extractor = BlockingScheduler("ytdl", EXTRACTION_WORKERS, PER_GUILD_EXTRACTIONS)
+        # Stream info for the head of each guild's queue, resolved while the
+        # current track plays so the next one can start immediately
+        self.prefetched: Dict[int, Dict] = {}
+        self.prefetch_tasks: Dict[int, asyncio.Task] = {}
+        # One event-driven player task per guild, created on first use
+        self.players: Dict[int, GuildPlayer] = {}
+        # Bumped whenever what the dashboard shows changes; its event
+        # streams wait on this instead of polling
+        self.state_feed = StateFeed()
+        # Immutable, versioned copies of each guild's dashboard state, rebuilt
+        # on the loop after changes and read by web threads without locking
+        self.snapshots: Dict[int, Mapping] = {}
+        self.overview: Mapping = MappingProxyType({'version': 0, 'guilds': ()})
+        self._stale_snapshots = set()
         
+    async def cog_load(self):
+        shard_ids = getattr(self.bot, 'shard_ids', None)
+        if shard_ids is not None and len(shard_ids) < self.bot.shard_count:
+            # Other processes run the remaining shards against the same database
+            self.queues.partition(self.bot.shard_count, shard_ids)
+        # Rehydrate queues persisted by a previous run (or before a crash)
+        await self.queues.load()
+        self.queues.start()
+        # Build the first instance of each profile before the first /play needs it
+        await asyncio.get_running_loop().run_in_executor(None, self.ytdl_pool.warm)
+        if self.voice_workers:
+            await asyncio.get_running_loop().run_in_executor(None, self.voice_workers.start)
+        if self.extraction_cache.persist_path:
+            self.cache_save_task = asyncio.create_task(self.save_extraction_cache_periodically())
+
+    async def cog_unload(self):
+        # Write out any pending queue changes before shutting down
+        for guild_id in list(self.players):
+            await self.stop_player(guild_id)
+        await self.queues.close()
+        self.extractor.shutdown()
+        for task in self.prefetch_tasks.values():
+            task.cancel()
+        if self.cache_save_task:
+            self.cache_save_task.cancel()
+        self.extraction_cache.save()
+        if self.audio_cache:
+            self.audio_cache.save_index()
+        self.ytdl_pool.close()
+        if self.voice_workers:
+            self.voice_workers.close()
+
+    async def save_extraction_cache_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(EXTRACTION_CACHE_SAVE_INTERVAL)
+            await loop.run_in_executor(None, self.extraction_cache.save)
+
     async def get_queue(self, guild_id: int) -> List[Dict]:
-        # Now async and fetches from DB
-        db_queue = await self.db.get_queue(guild_id)
+        # Served from the in-memory queue, no DB round-trip
         # We need to resolve channel_id to actual objects for the cog to work seamlessly
         # or update the consumers to handle IDs. Let's resolve here for compatibility.
         resolved_queue = []
-        for item in db_queue:
-            # item is a dict (from Row)
+        for item in self.queues.get(guild_id):
+            # item is a copy, safe to annotate
             item['channel'] = self.bot.get_channel(item['channel_id'])
             resolved_queue.append(item)
         return resolved_queue
 
+    def build_snapshot(self, guild_id: int) -> Optional[Mapping]:
+        # Everything the dashboard shows for one guild, from memory only.
+        # Loop thread only; web threads read the published copy in self.snapshots.
+        guild = self.bot.get_guild(guild_id)
+        if guild is None:
+            return None
+        # Read before the state, so the snapshot is at least this new
+        version = self.state_feed.version(guild_id)
+        voice_client = guild.voice_client
+        connected = isinstance(voice_client, discord.VoiceClient) and voice_client.is_connected()
+        current = self.current_songs.get(guild_id)
+        player = self.players.get(guild_id)
+        return MappingProxyType({
+            'version': version,
+            'guild_id': guild_id,
+            'guild_name': guild.name,
+            # Without the channel object, so the snapshot is plain data
+            'current_song': MappingProxyType({key: value for key, value in current.items() if key != 'channel'}) if current else None,
+            'queue': tuple(MappingProxyType(item) for item in self.queues.get(guild_id)),
+            'is_playing': connected and voice_client.is_playing(),
+            'is_paused': connected and voice_client.is_paused(),
+            'voice_connected': connected,
+            'volume': int(self.get_volume(guild_id) * 100),
+            'loop_state': self.loop_states.get(guild_id, False),
+            'effects': MappingProxyType(self.get_effects(guild_id).to_dict()),
+            'player_state': player.state.value if player else 'idle',
+        })
+
+    def build_overview(self) -> Mapping:
+        # One row per guild with a voice connection; guilds the bot is merely
+        # a member of are never visited
+        version = self.state_feed.version()
+        summaries = []
+        for voice_client in self.bot.voice_clients:
+            guild = voice_client.guild
+            current = self.current_songs.get(guild.id)
+            summaries.append(MappingProxyType({
+                'guild_id': guild.id,
+                'guild_name': guild.name,
+                'current_title': current['title'] if current else None,
+                'queue_length': self.queues.length(guild.id),
+                'is_playing': voice_client.is_playing(),
+                'is_paused': voice_client.is_paused(),
+            }))
+        summaries.sort(key=lambda summary: summary['guild_name'].lower())
+        return MappingProxyType({'version': version, 'guilds': tuple(summaries)})
+
+    def refresh_snapshots(self, guild_id: int):
+        self._stale_snapshots.discard(guild_id)
+        snapshot = self.build_snapshot(guild_id)
+        # Replacing the reference is atomic, so readers never need a lock
+        if snapshot is None:
+            self.snapshots.pop(guild_id, None)
+        else:
+            self.snapshots[guild_id] = snapshot
+        self.overview = self.build_overview()
+
+    async def guild_snapshot(self, guild_id: int) -> Optional[Mapping]:
+        # For a guild nobody has looked at yet; later reads hit self.snapshots
+        self.refresh_snapshots(guild_id)
+        return self.snapshots.get(guild_id)
+
+    def publish_state(self, guild_id: int):
+        # Safe to call from any thread
+        self.state_feed.publish(guild_id)
+        # One rebuild per burst of changes, on the loop where the state lives
+        if guild_id not in self._stale_snapshots:
+            self._stale_snapshots.add(guild_id)
+            self.bot.loop.call_soon_threadsafe(self.refresh_snapshots, guild_id)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        # The bot joining, moving or leaving changes what the dashboard shows
+        if self.bot.user and member.id == self.bot.user.id:
+            self.publish_state(member.guild.id)
+
+    def get_volume(self, guild_id: int) -> float:
+        return self.volumes.get(guild_id, DEFAULT_VOLUMES[self.audio_mode])
+
     def set_volume(self, guild_id: int, volume: float):
         # Clamp between 0.0 and 1.0
         volume = max(0.0, min(1.0, volume))
         self.volumes[guild_id] = volume
+        self.publish_state(guild_id)
         
         # If currently playing, update immediate source
+        # (in opus mode the volume is baked into FFmpeg and applies from the next track;
+        # voice worker sources forward it to their worker)
         voice_client = self.bot.get_guild(guild_id).voice_client if self.bot.get_guild(guild_id) else None
-        if voice_client and voice_client.source and isinstance(voice_client.source, discord.PCMVolumeTransformer):
+        if voice_client and voice_client.source and isinstance(voice_client.source, (discord.PCMVolumeTransformer, WorkerAudioSource)):
             voice_client.source.volume = volume
 
     async def remove_song(self, guild_id: int, song_id: int):
-        await self.db.remove_from_queue(guild_id, song_id)
+        self.queues.remove(guild_id, song_id)
+        self.publish_state(guild_id)
+        self.prefetch_next(guild_id)
 
     def toggle_loop(self, guild_id: int) -> bool:
         current = self.loop_states.get(guild_id, False)
         self.loop_states[guild_id] = not current
+        self.publish_state(guild_id)
         return not current
 
     async def shuffle_queue(self, guild_id: int):
-        await self.db.shuffle_queue(guild_id)
+        self.queues.shuffle(guild_id)
+        self.publish_state(guild_id)
+        self.prefetch_next(guild_id)
+
+    async def reverse_queue(self, guild_id: int):
+        self.queues.reverse(guild_id)
+        self.publish_state(guild_id)
+        self.prefetch_next(guild_id)
+
+    async def sort_queue(self, guild_id: int, key: str):
+        self.queues.sort(guild_id, key)
+        self.publish_state(guild_id)
+        self.prefetch_next(guild_id)
+
+    async def move_songs(self, guild_id: int, start: int, count: int, new_index: int) -> bool:
+        moved = self.queues.move_range(guild_id, start, count, new_index)
+        self.publish_state(guild_id)
+        self.prefetch_next(guild_id)
+        return moved
 
     async def clear_state(self, guild_id: int):
-        await self.db.clear_queue(guild_id)
+        self.queues.clear(guild_id)
+        self.drop_prefetch(guild_id)
         if guild_id in self.current_songs:
             del self.current_songs[guild_id]
         if guild_id in self.loop_states:
             self.loop_states[guild_id] = False
+        self.publish_state(guild_id)
+
+    def cache_stream_info(self, webpage_url, info):
+        # Keep the entry only for as long as the signed URL can still play the whole track
+        stream_url = info.get('url')
+        if not stream_url:
+            return
+        expires_at = stream_url_expiry(stream_url) - (info.get('duration') or 0) - STREAM_URL_EXPIRY_MARGIN
+        self.extraction_cache.put('stream', webpage_url, {
+            'url': stream_url,
+            'title': info.get('title'),
+            'thumbnail': info.get('thumbnail'),
+            'duration': info.get('duration'),
+            'acodec': info.get('acodec'),
+        }, expires_at)
 
     def get_stream_url(self, webpage_url):
-        ydl_opts: Any = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'quiet': True,
-            'no_warnings': True,
-            'nocheckcertificate': True,
-            'extractor_args': {
-                'youtube': {
-                    'player_client': ['android', 'web','ios'],
-                },
-            },
-        }
-        
+        cached = self.extraction_cache.get('stream', webpage_url)
+        if cached:
+            STREAM_LOOKUPS.inc('cache')
+            return cached['url'], cached['title'], cached['thumbnail'], cached['duration'], cached.get('acodec')
+
         # Apply strict SoundCloud filter if URL identifies as such
-        if "soundcloud.com" in webpage_url:
-             ydl_opts['format'] = 'bestaudio[protocol=http]'
+        profile = 'stream_soundcloud' if "soundcloud.com" in webpage_url else 'stream'
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        STREAM_LOOKUPS.inc('extracted')
+        with self.ytdl_pool.checkout(profile) as ydl, EXTRACTION_SECONDS.time('stream'):
             info = ydl.extract_info(webpage_url, download=False)
-            return info.get('url'), info.get('title'), info.get('thumbnail'), info.get('duration')
+            self.cache_stream_info(webpage_url, info)
+            return info.get('url'), info.get('title'), info.get('thumbnail'), info.get('duration'), info.get('acodec')
+
+    async def resolve_stream(self, guild_id: int, webpage_url: str):
+        # Concurrent resolutions of the same page (prefetch racing the player,
+        # or two guilds playing the same song) share one extraction. Playback
+        # has priority over the guild's other extractions (e.g. a /playlist
+        # import), which could otherwise outlast TRACK_START_TIMEOUT.
+        return await self.extractor.run(
+            guild_id, self.get_stream_url, webpage_url, key=('stream', normalize_key(webpage_url)), priority=True
+        )
 
-    def play_next(self, voice_client):
-        if not voice_client or not voice_client.guild:
+    def prefetch_next(self, guild_id: int):
+        # Resolve the stream of whatever plays next in the background. Cheap
+        # to call after any queue change: it is a no-op when the head of the
+        # queue is already prefetched or being prefetched.
+        guild = self.bot.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        if not isinstance(voice_client, discord.VoiceClient) or not (voice_client.is_playing() or voice_client.is_paused()):
             return
 
-        guild_id = voice_client.guild.id
-        
-        # We need to run this async because we're in a synchronous callback (after=...)
-        # or just a synchronous chain.
-        async def play_process():
+        next_song = self.queues.peek(guild_id)
+        if not next_song and self.loop_states.get(guild_id, False):
+            # Looping with an empty queue: the current song plays again
+            next_song = self.current_songs.get(guild_id)
+        if not next_song:
+            return
+        webpage_url = next_song['webpage_url']
+        if self.audio_cache and self.audio_cache.contains(webpage_url):
+            # Will play from disk, nothing to resolve
+            return
+
+        cached = self.prefetched.get(guild_id)
+        if cached and cached['webpage_url'] == webpage_url:
+            return
+        task = self.prefetch_tasks.get(guild_id)
+        if task and not task.done():
+            if task.get_name() == webpage_url:
+                return
+            task.cancel()
+
+        async def _prefetch():
             try:
-                # 1. Handle Loop Logic
-                if self.loop_states.get(guild_id, False):
-                    # If looping, re-add the song that just finished
-                    if guild_id in self.current_songs:
-                        finished_song = self.current_songs[guild_id]
-                        # We need to re-add it to the DB
-                        await self.db.add_to_queue(guild_id, finished_song)
-
-                # 2. Get next song from DB (pop)
-                next_song = await self.db.pop_from_queue(guild_id)
-
-                if not next_song:
-                    # Queue empty
-                    if guild_id in self.current_songs:
-                         del self.current_songs[guild_id]
-                    # Disconnect if desired? For now just stop.
-                    # await voice_client.disconnect() 
-                    return
+                # Background work; a trace of its own rather than part of
+                # whichever command or cycle scheduled it
+                with trace('prefetch', root=True, guild=guild_id):
+                    stream_url, title, thumb, dur, acodec = await self.resolve_stream(guild_id, webpage_url)
+            except Exception as e:
+                print(f"Prefetch failed for {webpage_url}: {e}")
+                return None
+            if not stream_url:
+                return None
+            info = {
+                'webpage_url': webpage_url,
+                'stream_url': stream_url,
+                'title': title,
+                'thumbnail': thumb,
+                'duration': dur,
+                'acodec': acodec,
+                'expires_at': stream_url_expiry(stream_url),
+            }
+            self.prefetched[guild_id] = info
+            return info
 
-                # Resolve Channel Object (DB returned ID)
-                channel_id = next_song.get('channel_id')
-                channel = self.bot.get_channel(channel_id) if channel_id else None
-                
-                # Update current song state WITH channel object
-                next_song['channel'] = channel
-                self.current_songs[guild_id] = next_song
-                
-                webpage_url = next_song['webpage_url']
-                requested_title = next_song['title']
-                requester = next_song.get('requester', 'User')
-
-                loop = asyncio.get_running_loop()
-                stream_url, title, thumb, dur = await loop.run_in_executor(None, lambda: self.get_stream_url(webpage_url))
-                
-                if not stream_url:
-                    if channel:
-                        await channel.send(f"Could not play **{title}**.")
-                    # Recursively call play_next (unsafe if infinite loop of failures?)
-                    # Better to just schedule it again
-                    self.play_next(voice_client)
-                    return
+        self.prefetch_tasks[guild_id] = asyncio.create_task(_prefetch(), name=webpage_url)
 
-                def after_playing(error):
-                    if error:
-                        print(f"Player error: {error}")
-                    self.play_next(voice_client)
+    async def take_prefetched(self, guild_id: int, webpage_url: str, duration=None) -> Optional[Dict]:
+        # Returns prefetched stream info for webpage_url if it is still usable,
+        # waiting for an in-flight prefetch of the same URL instead of starting
+        # a second extraction
+        info = self.prefetched.pop(guild_id, None)
+        task = self.prefetch_tasks.get(guild_id)
+        if (info is None or info['webpage_url'] != webpage_url) and task and not task.done() and task.get_name() == webpage_url:
+            try:
+                info = await task
+            except asyncio.CancelledError:
+                info = None
+            self.prefetched.pop(guild_id, None)
+        if not info or info['webpage_url'] != webpage_url:
+            return None
+        remaining = info['expires_at'] - time.time()
+        if remaining < (duration or info['duration'] or 0) + STREAM_URL_EXPIRY_MARGIN:
+            return None
+        return info
 
-                if not voice_client.is_connected():
-                    return
+    def drop_prefetch(self, guild_id: int):
+        self.prefetched.pop(guild_id, None)
+        task = self.prefetch_tasks.pop(guild_id, None)
+        if task and not task.done():
+            task.cancel()
 
-                if not voice_client.is_connected():
-                    return
+    def get_effects(self, guild_id: int) -> AudioEffects:
+        return self.effects.get(guild_id) or AudioEffects()
 
-                # Create Audio Source
-                original_source = discord.FFmpegPCMAudio(
-                    stream_url,
-                    before_options='-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5 -protocol_whitelist file,http,https,tcp,tls',
-                    options='-vn'
-                )
-                
-                # Wrap in Volume Transformer
-                # We need to store the volume state somewhere if we want it to persist between songs
-                # For now, let's default to self.volumes.get(guild_id, 0.5)
-                current_vol = self.volumes.get(guild_id, 0.5) # Default 50%
-                source = discord.PCMVolumeTransformer(original_source, volume=current_vol)
-                
-                voice_client.play(source, after=after_playing)
-                
-                if channel:
-                    embed = discord.Embed(
-                        title="Now Playing", 
-                        description=f"[{title}]({webpage_url})",
-                        color=discord.Color.from_rgb(0, 229, 255)
-                    )
-                    if thumb:
-                        embed.set_thumbnail(url=thumb)
-                    
-                    duration_str = "Unknown"
-                    if dur:
-                        minutes = int(dur // 60)
-                        seconds = int(dur % 60)
-                        duration_str = f"{minutes}:{seconds:02d}"
-
-                    embed.add_field(name="Duration", value=duration_str, inline=True)
-                    embed.add_field(name="Requested By", value=requester, inline=True)
-                    
-                    # Peek at next song (without popping)
-                    queue = await self.db.get_queue(guild_id)
-                    if queue:
-                        next_up_title = queue[0]['title']
-                        embed.add_field(name="Next Up", value=next_up_title, inline=False)
-                    
-                    view = MusicControls(self.bot, voice_client)
-                    # Update loop button state
-                    if self.loop_states.get(guild_id, False):
-                         for child in view.children:
-                             if isinstance(child, discord.ui.Button) and child.label == "Loop":
-                                 child.style = discord.ButtonStyle.success
+    def set_effects(self, guild_id: int, effects: AudioEffects):
+        # Effects are part of the FFmpeg command line, so they apply from the next track
+        self.effects[guild_id] = effects
+        self.publish_state(guild_id)
 
-                    await channel.send(embed=embed, view=view)
+    def create_source(self, guild_id: int, stream_url: str, acodec=None, local=False, duration=None):
+        # Reconnect options only apply to network streams
+        before_options = None if local else FFMPEG_STREAM_OPTIONS
+        volume = self.get_volume(guild_id)
+        effects = self.get_effects(guild_id)
+        spec = {'url': stream_url, 'before_options': before_options}
 
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                print(f"Error in play_next: {e} | Type: {type(e)}")
-                if channel: # channel might be None if resolved failed
-                    await channel.send(f"Error playing song: {e}")
-                self.play_next(voice_client)
+        if self.audio_mode == 'opus':
+            chain = effects.filter_chain(volume, duration)
+            if acodec == 'opus' and not chain:
+                # Already Opus at unity gain: FFmpeg only remuxes the packets,
+                # nothing is decoded or encoded anywhere
+                spec.update(kind='opus', codec='copy', options='-vn')
+            else:
+                spec.update(kind='opus', options=f'-vn -filter:a {shlex.quote(chain)}' if chain else '-vn')
+        else:
+            # Effects run in FFmpeg, volume stays adjustable live
+            chain = effects.filter_chain(1.0, duration)
+            spec.update(kind='pcm', volume=volume, options=f'-vn -filter:a {shlex.quote(chain)}' if chain else '-vn')
 
-        asyncio.run_coroutine_threadsafe(play_process(), self.bot.loop)
+        if self.voice_workers:
+            # Decoding, volume and Opus encoding happen in a worker process
+            return self.voice_workers.open_source(spec)
+        return build_source(spec)
 
-    @app_commands.command(name="play", description="Play a song or add it to the queue.")
-    @app_commands.describe(song_query="search query")
-    async def play(self, interaction: discord.Interaction, song_query: str):
-        if not interaction.guild:
-            await interaction.response.send_message("Servers only.")
-            return
+    def get_player(self, guild_id: int) -> GuildPlayer:
+        player = self.players.get(guild_id)
+        if player is None:
+            player = GuildPlayer(
+                guild_id,
+                start_next=lambda after: self.start_next_track(guild_id, after),
+                stop_playback=lambda: self.stop_playback(guild_id),
+                track_finished=lambda: self.finish_track(guild_id),
+            )
+            player.start()
+            self.players[guild_id] = player
+        return player
 
-        await interaction.response.defer() 
-        
+    def notify_enqueued(self, guild_id: int):
+        # Starts playback if the guild's player is idle; no-op otherwise
+        self.get_player(guild_id).post(PlayerEvent.ENQUEUED)
+
+    def skip_track(self, guild_id: int):
+        player = self.players.get(guild_id)
+        if player:
+            player.post(PlayerEvent.SKIP)
+        else:
+            self.stop_playback(guild_id)
+
+    async def stop_player(self, guild_id: int):
+        player = self.players.pop(guild_id, None)
+        if player:
+            await player.stop()
+
+    def stop_playback(self, guild_id: int):
+        guild = self.bot.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        if isinstance(voice_client, discord.VoiceClient) and (voice_client.is_playing() or voice_client.is_paused()):
+            voice_client.stop()
+
+    def finish_track(self, guild_id: int):
+        # Looping: the song that just finished goes to the back of the queue
+        if self.loop_states.get(guild_id, False) and guild_id in self.current_songs:
+            self.queues.append(guild_id, self.current_songs[guild_id])
+            self.publish_state(guild_id)
+
+    async def start_next_track(self, guild_id: int, after) -> bool:
+        # Called by the guild's player only. Returns False when there is
+        # nothing to play; raises when the next song cannot be played (it is
+        # dropped, and the player retries with the one after it).
+        # The player's task inherited the context of the command that started
+        # it, so each cycle is a trace of its own.
+        with trace('play_next', root=True, guild=guild_id):
+            return await self._start_next_track(guild_id, after)
+
+    async def _start_next_track(self, guild_id: int, after) -> bool:
+        started_at = time.perf_counter()
+        guild = self.bot.get_guild(guild_id)
+        voice_client = guild.voice_client if guild else None
+        if not isinstance(voice_client, discord.VoiceClient) or not voice_client.is_connected():
+            TRACK_STARTS.inc('disconnected')
+            return False
+
+        next_song = self.queues.pop(guild_id)
+        if not next_song:
+            # Queue empty
+            TRACK_STARTS.inc('queue_empty')
+            if self.current_songs.pop(guild_id, None):
+                self.publish_state(guild_id)
+            return False
+        self.publish_state(guild_id)
+
+        # Resolve Channel Object (queue stores the ID)
+        channel_id = next_song.get('channel_id')
+        channel = self.bot.get_channel(channel_id) if channel_id else None
+        next_song['channel'] = channel
+
+        webpage_url = next_song['webpage_url']
+        title = next_song['title']
+        requester = next_song.get('requester', 'User')
+
+        try:
+            # A warm local copy needs no extraction and no network at all
+            cached_path = self.audio_cache.lookup(webpage_url) if self.audio_cache else None
+            if cached_path:
+                stream_url = cached_path
+                thumb = next_song.get('thumbnail')
+                dur = next_song.get('duration')
+                # AudioCache stores Ogg/Opus
+                acodec = 'opus'
+                origin = 'audio_cache'
+            else:
+                with span('resolve') as step:
+                    prefetched = await self.take_prefetched(guild_id, webpage_url, next_song.get('duration'))
+                    if prefetched:
+                        stream_url = prefetched['stream_url']
+                        title = prefetched['title']
+                        thumb = prefetched['thumbnail']
+                        dur = prefetched['duration']
+                        acodec = prefetched['acodec']
+                        origin = 'prefetched'
+                    else:
+                        stream_url, title, thumb, dur, acodec = await self.resolve_stream(guild_id, webpage_url)
+                        origin = 'resolved'
+                    step.set(origin=origin)
+
+            if not stream_url:
+                raise RuntimeError("no playable stream found")
+
+            if not voice_client.is_connected():
+                TRACK_STARTS.inc('disconnected')
+                return False
+
+            with span('create_source', origin=origin):
+                source = self.create_source(guild_id, stream_url, acodec, local=bool(cached_path), duration=dur)
+                voice_client.play(source, after=after)
+            TRACK_START_SECONDS.observe(time.perf_counter() - started_at, origin)
+            TRACK_STARTS.inc('started')
+        except Exception as e:
+            TRACK_STARTS.inc('failed')
+            if channel:
+                try:
+                    await channel.send(f"Could not play **{title}**: {e}")
+                except discord.HTTPException:
+                    pass
+            raise
+
+        # Update current song state WITH channel object
+        self.current_songs[guild_id] = next_song
+        self.publish_state(guild_id)
+
+        # Frequently replayed tracks get a local copy for next time
+        if self.audio_cache and not cached_path and self.audio_cache.record_play(webpage_url, dur):
+            asyncio.create_task(self.audio_cache.store(webpage_url, stream_url))
+        # Resolve the following track while this one plays
+        self.prefetch_next(guild_id)
+
+        if channel:
+            embed = discord.Embed(
+                title="Now Playing", 
+                description=f"[{title}]({webpage_url})",
+                color=discord.Color.from_rgb(0, 229, 255)
+            )
+            if thumb:
+                embed.set_thumbnail(url=thumb)
+            
+            duration_str = "Unknown"
+            if dur:
+                minutes = int(dur // 60)
+                seconds = int(dur % 60)
+                duration_str = f"{minutes}:{seconds:02d}"
+
+            embed.add_field(name="Duration", value=duration_str, inline=True)
+            embed.add_field(name="Requested By", value=requester, inline=True)
+            
+            # Peek at next song (without popping)
+            next_up = self.queues.peek(guild_id)
+            if next_up:
+                next_up_title = next_up['title']
+                embed.add_field(name="Next Up", value=next_up_title, inline=False)
+            
+            view = MusicControls(self.bot, voice_client)
+            # Update loop button state
+            if self.loop_states.get(guild_id, False):
+                 for child in view.children:
+                     if isinstance(child, discord.ui.Button) and child.label == "Loop":
+                         child.style = discord.ButtonStyle.success
+
+            try:
+                with span('now_playing'):
+                    await channel.send(embed=embed, view=view)
+            except discord.HTTPException as e:
+                # The track is playing; a missing message is not a playback failure
+                print(f"Failed to send Now Playing message: {e}")
+
+        return True
+
+    async def join_voice(self, interaction: discord.Interaction):
+        # Connects to (or moves to) the caller's voice channel; expects a deferred response
         if not isinstance(interaction.user, discord.Member) or not interaction.user.voice or not interaction.user.voice.channel:
             await interaction.followup.send("Join a voice channel first.")
-            return
+            return None
 
         voice_channel = interaction.user.voice.channel
         voice_client = interaction.guild.voice_client
@@ -323,47 +728,181 @@ class Music(commands.Cog):
         elif voice_channel != voice_client.channel:
             if isinstance(voice_client, discord.VoiceClient):
                 await voice_client.move_to(voice_channel) 
-        
-        ydl_opts: Any = {
-            'format': 'bestaudio/best',
-            'noplaylist': True,
-            'quiet': True,
-            'no_warnings': True,
-            'nocheckcertificate': True,
-            'default_search': 'ytsearch',
-            'extractor_args': {'youtube': {'player_client': ['android', 'ios', 'web']}},
+        return voice_client
+
+    def extract_playlist(self, playlist_url):
+        with self.ytdl_pool.checkout('playlist') as ydl, EXTRACTION_SECONDS.time('playlist'):
+            return ydl.extract_info(playlist_url, download=False)
+
+    def resolve_entry(self, webpage_url):
+        # Full extraction of a single entry, used when the flat listing lacks metadata
+        with self.ytdl_pool.checkout('entry') as ydl, EXTRACTION_SECONDS.time('entry'):
+            return ydl.extract_info(webpage_url, download=False)
+
+    @staticmethod
+    def flat_entry_to_song(entry):
+        webpage_url = entry.get('webpage_url') or entry.get('url')
+        if webpage_url and not webpage_url.startswith('http') and entry.get('ie_key') == 'Youtube':
+            webpage_url = f"https://www.youtube.com/watch?v={entry.get('id')}"
+        thumbnail = entry.get('thumbnail')
+        if not thumbnail and entry.get('thumbnails'):
+            thumbnail = entry['thumbnails'][-1].get('url')
+        return {
+            'webpage_url': webpage_url,
+            'title': entry.get('title'),
+            'thumbnail': thumbnail,
+            'duration': entry.get('duration'),
         }
+
+    @app_commands.command(name="playlist", description="Add every song of a playlist to the queue.")
+    @app_commands.describe(playlist_url="link to a YouTube or SoundCloud playlist")
+    async def playlist(self, interaction: discord.Interaction, playlist_url: str):
+        with COMMAND_SECONDS.time('playlist'), trace('/playlist', root=True, guild=interaction.guild_id):
+            await self.enqueue_playlist(interaction, playlist_url)
+
+    async def enqueue_playlist(self, interaction: discord.Interaction, playlist_url: str):
+        if not interaction.guild:
+            await interaction.response.send_message("Servers only.")
+            return
+
+        await interaction.response.defer()
+
+        voice_client = await self.join_voice(interaction)
+        if voice_client is None:
+            return
+
+        guild_id = interaction.guild.id
+        try:
+            info = await self.extractor.run(guild_id, self.extract_playlist, playlist_url)
+        except Exception as e:
+            await interaction.followup.send(f"Error loading playlist: {e}")
+            return
+
+        entries = [entry for entry in (info.get('entries') or []) if entry][:MAX_PLAYLIST_TRACKS]
+        if not entries:
+            await interaction.followup.send("No songs found in that playlist.")
+            return
+
+        playlist_title = info.get('title') or 'playlist'
+        progress = await interaction.followup.send(f"Loading **{playlist_title}**: 0/{len(entries)}...", wait=True)
+
+        songs: List[Optional[Dict]] = [self.flat_entry_to_song(entry) for entry in entries]
+        # Only entries the flat listing could not describe need a full extraction
+        missing = [
+            index for index, song in enumerate(songs)
+            if song['webpage_url'] and (not song['title'] or song['duration'] is None)
+        ]
+
+        async def resolve(index):
+            try:
+                full = await self.extractor.run(guild_id, self.resolve_entry, songs[index]['webpage_url'])
+                songs[index].update({
+                    'webpage_url': full.get('webpage_url') or songs[index]['webpage_url'],
+                    'title': full.get('title') or songs[index]['title'],
+                    'thumbnail': full.get('thumbnail') or songs[index]['thumbnail'],
+                    'duration': full.get('duration'),
+                })
+            except Exception as e:
+                print(f"Failed to resolve playlist entry {songs[index]['webpage_url']}: {e}")
+                if not songs[index]['title']:
+                    songs[index] = None
+
+        done = len(entries) - len(missing)
+        last_edit = time.monotonic()
+        for finished in asyncio.as_completed([resolve(index) for index in missing]):
+            await finished
+            done += 1
+            if time.monotonic() - last_edit >= PLAYLIST_PROGRESS_INTERVAL:
+                last_edit = time.monotonic()
+                await progress.edit(content=f"Loading **{playlist_title}**: {done}/{len(entries)}...")
+
+        requester = interaction.user.display_name
+        queue_items = []
+        for song in songs:
+            if not song or not song['webpage_url']:
+                continue
+            song['title'] = song['title'] or 'Untitled'
+            song['channel'] = interaction.channel
+            song['requester'] = requester
+            queue_items.append(song)
+
+        # One batch, persisted by the queue store in a single transaction
+        self.queues.extend(guild_id, queue_items)
+        self.publish_state(guild_id)
+        self.prefetch_next(guild_id)
+
+        skipped = len(entries) - len(queue_items)
+        summary = f"Added **{len(queue_items)}** songs from **{playlist_title}** to the queue."
+        if skipped:
+            summary += f" ({skipped} unavailable)"
+        await progress.edit(content=summary)
+
+        if queue_items:
+            self.notify_enqueued(guild_id)
+
+    @app_commands.command(name="play", description="Play a song or add it to the queue.")
+    @app_commands.describe(song_query="search query")
+    async def play(self, interaction: discord.Interaction, song_query: str):
+        with COMMAND_SECONDS.time('play'), trace('/play', root=True, guild=interaction.guild_id):
+            await self.play_song(interaction, song_query)
+
+    async def play_song(self, interaction: discord.Interaction, song_query: str):
+        if not interaction.guild:
+            await interaction.response.send_message("Servers only.")
+            return
+
+        with span('defer'):
+            await interaction.response.defer()
+
+        with span('join_voice'):
+            voice_client = await self.join_voice(interaction)
+        if voice_client is None:
+            return
         
         def search_song(query):
             # Attempt 1: Default (YouTube)
             try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                with self.ytdl_pool.checkout('search') as ydl, EXTRACTION_SECONDS.time('search'):
                     info = ydl.extract_info(query, download=False)
                     return info, "YouTube"
             except Exception as e:
                 print(f"YouTube search failed: {e}")
                 # Attempt 2: SoundCloud (Force progressive HTTP MP3 to avoid HLS issues entirely)
-                sc_opts = ydl_opts.copy()
-                sc_opts['default_search'] = 'scsearch'
-                # Strictly prefer HTTP protocol (progressive download)
-                sc_opts['format'] = 'bestaudio[protocol=http]'
-                with yt_dlp.YoutubeDL(sc_opts) as ydl:
+                with self.ytdl_pool.checkout('search_soundcloud') as ydl, EXTRACTION_SECONDS.time('search_soundcloud'):
                     info = ydl.extract_info(query, download=False)
                     print(f"SoundCloud Fallback: Selected URL: {info.get('url')} | Ext: {info.get('ext')}")
                     return info, "SoundCloud"
 
-        loop = asyncio.get_running_loop()
-        try:
-            info, source_platform = await loop.run_in_executor(None, lambda: search_song(song_query))
-        except Exception as e:
-            await interaction.followup.send(f"Error finding song on YouTube and SoundCloud: {e}")
-            return
-
-        if 'entries' in info:
-            if not info['entries']:
-                await interaction.followup.send("No results.")
+        cached = self.extraction_cache.get('search', song_query)
+        if cached:
+            info, source_platform = cached, cached['source_platform']
+        else:
+            try:
+                with span('search'):
+                    info, source_platform = await self.extractor.run(
+                        interaction.guild.id, search_song, song_query, key=('search', normalize_key(song_query))
+                    )
+            except Exception as e:
+                await interaction.followup.send(f"Error finding song on YouTube and SoundCloud: {e}")
                 return
-            info = info['entries'][0]
+
+            if 'entries' in info:
+                if not info['entries']:
+                    await interaction.followup.send("No results.")
+                    return
+                info = info['entries'][0]
+
+            # Only the fields /play needs are cached; the search already
+            # resolved a stream URL, so seed the stream cache for the player too
+            self.extraction_cache.put('search', song_query, {
+                'webpage_url': info.get('webpage_url'),
+                'title': info.get('title', 'Untitled'),
+                'thumbnail': info.get('thumbnail'),
+                'duration': info.get('duration'),
+                'source_platform': source_platform,
+            }, time.time() + SEARCH_TTL)
+            if info.get('webpage_url'):
+                self.cache_stream_info(info['webpage_url'], info)
         
         webpage_url = info.get('webpage_url')
         title = info.get('title', 'Untitled')
@@ -380,16 +919,13 @@ class Music(commands.Cog):
         }
 
         guild_id = interaction.guild.id
-        guild_id = interaction.guild.id
-        # Use DB Count or Fetch
-        # We can just add it blindly first
-        await self.db.add_to_queue(guild_id, queue_item)
+        with span('enqueue', cached=bool(cached)):
+            self.queues.append(guild_id, queue_item)
+            self.publish_state(guild_id)
+            self.prefetch_next(guild_id)
         
         # Determine if we are already playing to decide response
         if isinstance(voice_client, discord.VoiceClient) and voice_client.is_playing():
-            # Fetch queue for position info
-            queue = await self.db.get_queue(guild_id)
-            
             embed = discord.Embed(
                 title="Added to Queue", 
                 description=f"[{title}]({webpage_url})",
@@ -406,18 +942,20 @@ class Music(commands.Cog):
 
             embed.add_field(name="Duration", value=duration_str, inline=True)
             
-            footer_text = f"Position: {len(queue)}"
+            footer_text = f"Position: {self.queues.length(guild_id)}"
             if source_platform == "SoundCloud":
                  footer_text += " | Source: SoundCloud ☁️"
             embed.set_footer(text=footer_text)
             
-            await interaction.followup.send(embed=embed)
+            with span('followup'):
+                await interaction.followup.send(embed=embed)
         else:
             msg = f"Loading **{title}**..."
             if source_platform == "SoundCloud":
                 msg += " (via SoundCloud ☁️)"
-            await interaction.followup.send(msg)
-            self.play_next(voice_client)
+            with span('followup'):
+                await interaction.followup.send(msg)
+            self.notify_enqueued(guild_id)
 
     @app_commands.command(name="pause", description="Pause the current song.")
     async def pause(self, interaction: discord.Interaction):
@@ -427,6 +965,7 @@ class Music(commands.Cog):
         voice_client = interaction.guild.voice_client
         if isinstance(voice_client, discord.VoiceClient) and voice_client.is_playing():
             voice_client.pause()
+            self.publish_state(interaction.guild.id)
             await interaction.response.send_message("Paused the music.")
         else:
             await interaction.response.send_message("Nothing is playing right now.", ephemeral=True)
@@ -439,6 +978,7 @@ class Music(commands.Cog):
         voice_client = interaction.guild.voice_client
         if isinstance(voice_client, discord.VoiceClient) and voice_client.is_paused():
             voice_client.resume()
+            self.publish_state(interaction.guild.id)
             await interaction.response.send_message("Resumed the music.")
         else:
             await interaction.response.send_message("The music is not paused.", ephemeral=True)
@@ -451,6 +991,7 @@ class Music(commands.Cog):
         voice_client = interaction.guild.voice_client
         if isinstance(voice_client, discord.VoiceClient):
             await self.clear_state(interaction.guild.id)
+            await self.stop_player(interaction.guild.id)
 
             if voice_client.is_playing() or voice_client.is_paused():
                 voice_client.stop()
@@ -465,8 +1006,94 @@ class Music(commands.Cog):
             await interaction.response.send_message("This command can only be used in servers.")
             return
         voice_client = interaction.guild.voice_client
-        if isinstance(voice_client, discord.VoiceClient) and voice_client.is_playing():
-            voice_client.stop()
+        if isinstance(voice_client, discord.VoiceClient) and (voice_client.is_playing() or voice_client.is_paused()):
+            self.skip_track(interaction.guild.id)
             await interaction.response.send_message("Skipped the song.")
         else:
-            await interaction.response.send_message("Nothing is playing to skip.", ephemeral=True)
\ No newline at end of file
+            await interaction.response.send_message("Nothing is playing to skip.", ephemeral=True)
+
+    @app_commands.command(name="shuffle", description="Shuffle the queue.")
+    async def shuffle(self, interaction: discord.Interaction):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in servers.")
+            return
+        if not self.queues.length(interaction.guild.id):
+            await interaction.response.send_message("The queue is empty.", ephemeral=True)
+            return
+        await self.shuffle_queue(interaction.guild.id)
+        await interaction.response.send_message("Queue shuffled 🔀")
+
+    @app_commands.command(name="reverse", description="Reverse the order of the queue.")
+    async def reverse(self, interaction: discord.Interaction):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in servers.")
+            return
+        if not self.queues.length(interaction.guild.id):
+            await interaction.response.send_message("The queue is empty.", ephemeral=True)
+            return
+        await self.reverse_queue(interaction.guild.id)
+        await interaction.response.send_message("Queue reversed.")
+
+    @app_commands.command(name="sort", description="Sort the queue.")
+    @app_commands.describe(by="what to sort the queue by")
+    @app_commands.choices(by=[
+        app_commands.Choice(name="Duration (shortest first)", value="duration"),
+        app_commands.Choice(name="Requester", value="requester"),
+    ])
+    async def sort(self, interaction: discord.Interaction, by: app_commands.Choice[str]):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in servers.")
+            return
+        if not self.queues.length(interaction.guild.id):
+            await interaction.response.send_message("The queue is empty.", ephemeral=True)
+            return
+        await self.sort_queue(interaction.guild.id, by.value)
+        await interaction.response.send_message(f"Queue sorted by {by.value}.")
+
+    @app_commands.command(name="move", description="Move songs to a different place in the queue.")
+    @app_commands.describe(
+        position="queue position of the first song to move",
+        to="queue position the songs should end up at",
+        count="how many consecutive songs to move"
+    )
+    async def move(self, interaction: discord.Interaction, position: int, to: int, count: int = 1):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in servers.")
+            return
+        # Positions are 1-based, as shown by the Queue button
+        if await self.move_songs(interaction.guild.id, position - 1, count, to - 1):
+            await interaction.response.send_message(f"Moved {count} song(s) to position {to}.")
+        else:
+            await interaction.response.send_message("Invalid queue position.", ephemeral=True)
+
+    @app_commands.command(name="effects", description="Set audio effects (applied from the next song).")
+    @app_commands.describe(
+        bass_boost="bass boost in dB (0 to turn off)",
+        normalize="even out loudness between songs",
+        crossfade="seconds of fade in/out at song boundaries (0 to turn off)",
+        gain="extra gain in dB"
+    )
+    async def effects_command(
+        self,
+        interaction: discord.Interaction,
+        bass_boost: Optional[app_commands.Range[float, 0.0, MAX_BASS_BOOST_DB]] = None,
+        normalize: Optional[bool] = None,
+        crossfade: Optional[app_commands.Range[float, 0.0, MAX_CROSSFADE]] = None,
+        gain: Optional[app_commands.Range[float, -MAX_GAIN_DB, MAX_GAIN_DB]] = None
+    ):
+        if not interaction.guild:
+            await interaction.response.send_message("This command can only be used in servers.")
+            return
+        current = self.get_effects(interaction.guild.id)
+        if bass_boost is None and normalize is None and crossfade is None and gain is None:
+            await interaction.response.send_message(f"Current effects: {current.describe()}", ephemeral=True)
+            return
+
+        effects = AudioEffects(
+            gain_db=current.gain_db if gain is None else gain,
+            normalize=current.normalize if normalize is None else normalize,
+            bass_boost_db=current.bass_boost_db if bass_boost is None else bass_boost,
+            crossfade=current.crossfade if crossfade is None else crossfade
+        )
+        self.set_effects(interaction.guild.id, effects)
+        await interaction.response.send_message(f"Effects set: {effects.describe()} (from the next song)")
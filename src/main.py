@@ -1,4 +1,7 @@
 import os
+import io
+import asyncio
+from collections import Counter
 import discord
 from discord.ext import commands
 from dotenv import load_dotenv
@@ -6,33 +9,37 @@ import discord.opus
 from cogs.music import Music
 from cogs.moderation import Moderation
 from utils.database import DatabaseManager
-import shutil
+from utils.extraction_cache import ExtractionCache
+from utils.audio_cache import AudioCache, DEFAULT_MIN_PLAYS
+from utils import tracing
+from utils.profiler import MAX_PROFILE_SECONDS, ProfilerBusy, profile_loop, sample_stacks
 
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DOWNLOAD_DIR = os.path.join(BASE_DIR, "data", "downloads")
 DB_PATH = os.path.join(BASE_DIR, "data", "user_warning.db")
+EXTRACTION_CACHE_PATH = os.path.join(BASE_DIR, "data", "extraction_cache.json")
+
+load_dotenv()
+# Processes running a subset of the shards share the database but keep
+# their own file caches, whose index files are not safe to share
+if os.getenv("SHARD_IDS"):
+    shard_suffix = "shards-" + os.getenv("SHARD_IDS").replace(",", "-")
+    DOWNLOAD_DIR = os.path.join(DOWNLOAD_DIR, shard_suffix)
+    EXTRACTION_CACHE_PATH = os.path.join(BASE_DIR, "data", f"extraction_cache.{shard_suffix}.json")
 
 # Ensure critical directories exist
 if not os.path.exists(DOWNLOAD_DIR):
     os.makedirs(DOWNLOAD_DIR)
 
-# One-time cleanup on start (optional)
-def cleanup_downloads():
-    if os.path.exists(DOWNLOAD_DIR):
-        for filename in os.listdir(DOWNLOAD_DIR):
-            file_path = os.path.join(DOWNLOAD_DIR, filename)
-            try:
-                if os.path.isfile(file_path) or os.path.islink(file_path):
-                    os.unlink(file_path)
-                elif os.path.isdir(file_path):
-                    shutil.rmtree(file_path)
-            except Exception as e:
-                print(f"Failed to delete {file_path}: {e}")
-
-load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 
+# Opt-in timing breakdowns of commands and track starts; slow ones are logged
+tracing.configure(
+    os.getenv('TRACING', 'false').lower() == 'true',
+    slow_threshold=int(os.getenv('TRACE_SLOW_MS', '500')) / 1000
+)
+
 # Explicitly load Opus on Linux (Alpine)
 if not discord.opus.is_loaded():
     # Common paths for Alpine/Linux
@@ -51,23 +58,62 @@ if not discord.opus.is_loaded():
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+# Sharding: SHARD_COUNT=auto lets Discord pick the count; SHARD_IDS (e.g.
+# "0,1") runs only those shards, so several processes can split the bot
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+
+if SHARD_COUNT or SHARD_IDS:
+    shard_count = None if (SHARD_COUNT or 'auto').lower() == 'auto' else int(SHARD_COUNT)
+    shard_ids = [int(shard_id) for shard_id in SHARD_IDS.split(',')] if SHARD_IDS else None
+    if shard_ids is not None and shard_count is None:
+        raise SystemExit("SHARD_IDS requires an explicit SHARD_COUNT")
+    bot = commands.AutoShardedBot(command_prefix="!", intents=intents, shard_count=shard_count, shard_ids=shard_ids)
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+# Servers per shard for the dashboard, kept current by the events below so
+# that rendering it never scans every guild
+bot.shard_guild_counts = Counter()
 
 # Initialize Utils
 db_manager = DatabaseManager(DB_PATH)
+# DOWNLOAD_DIR holds the local audio cache, which is kept across restarts
+# (AudioCache removes partial files left by an interrupted transcode)
+audio_cache = AudioCache(
+    DOWNLOAD_DIR,
+    max_bytes=int(os.getenv('AUDIO_CACHE_MAX_MB', '1024')) * 1024 * 1024,
+    min_plays=int(os.getenv('AUDIO_CACHE_MIN_PLAYS', str(DEFAULT_MIN_PLAYS)))
+)
+# yt-dlp results cache, optionally kept across restarts in the data directory
+extraction_cache = ExtractionCache(
+    persist_path=EXTRACTION_CACHE_PATH if os.getenv('EXTRACTION_CACHE_PERSIST', 'false').lower() == 'true' else None
+)
 
 @bot.event
 async def on_ready():
-    cleanup_downloads()
-    
+    # Recounted on every (re)connect, which may have missed joins or removals
+    bot.shard_guild_counts = Counter(guild.shard_id for guild in bot.guilds)
     # Add Cogs
     if not bot.get_cog('Music'):
-        await bot.add_cog(Music(bot, db_manager, DOWNLOAD_DIR))
+        await bot.add_cog(Music(
+            bot, db_manager, DOWNLOAD_DIR, extraction_cache, audio_cache,
+            audio_mode=os.getenv('AUDIO_MODE', 'pcm').lower(),
+            # Worker processes for audio playback; 0 plays in this process
+            voice_workers=int(os.getenv('VOICE_WORKERS', '0'))
+        ))
     if not bot.get_cog('Moderation'):
         await bot.add_cog(Moderation(bot, db_manager))
     
     print(f"{bot.user} is online! (Commands not synced automatically)")
 
+@bot.event
+async def on_guild_join(guild):
+    bot.shard_guild_counts[guild.shard_id] += 1
+
+@bot.event
+async def on_guild_remove(guild):
+    bot.shard_guild_counts[guild.shard_id] -= 1
+
 @bot.command()
 async def sync(ctx):
     """Syncs slash commands to the current guild for instant updates."""
@@ -82,8 +128,55 @@ async def sync(ctx):
         except Exception as e2:
              await ctx.send(f"Global sync also failed: {e2}")
 
+@bot.command()
+@commands.is_owner()
+async def profile(ctx, seconds: int = 10, mode: str = "sample"):
+    """Profiles the bot for a while and uploads the report.
+
+    "sample" samples every thread's stack (folded, as py-spy writes them);
+    "cprofile" runs cProfile on the event loop thread.
+    """
+    if mode not in ("sample", "cprofile"):
+        await ctx.send("Mode must be `sample` or `cprofile`.")
+        return
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        await ctx.send(f"Seconds must be between 1 and {MAX_PROFILE_SECONDS}.")
+        return
+    await ctx.send(f"Profiling for {seconds}s ({mode})...")
+    try:
+        if mode == "sample":
+            report = await asyncio.to_thread(sample_stacks, seconds)
+        else:
+            report = await asyncio.to_thread(profile_loop, asyncio.get_running_loop(), seconds)
+    except ProfilerBusy as e:
+        await ctx.send(str(e))
+        return
+    filename = "profile.folded" if mode == "sample" else "profile.txt"
+    await ctx.send(file=discord.File(io.BytesIO(report.encode('utf-8')), filename=filename))
+
+# How long shutdown waits for the cogs to write out their state
+SHUTDOWN_TIMEOUT = 15
+
+def close_bot_threadsafe(timeout=SHUTDOWN_TIMEOUT):
+    # Closes the bot from another thread (e.g. a signal handler while the bot
+    # runs in a daemon thread) and waits for it. Closing unloads the cogs,
+    # which flush the write-behind queue, the strike counts and the caches.
+    loop = bot.loop
+    if not isinstance(loop, asyncio.AbstractEventLoop) or loop.is_closed() or bot.is_closed():
+        return
+    future = asyncio.run_coroutine_threadsafe(bot.close(), loop)
+    try:
+        future.result(timeout=timeout)
+    except Exception as e:
+        # Leave the database open; the cogs may still be writing to it
+        print(f"Bot did not shut down cleanly: {e}")
+        return
+    db_manager.close()
+
 if __name__ == "__main__":
     if not TOKEN:
         print("Error: DISCORD_TOKEN not found in .env file.")
     else:
         bot.run(TOKEN)
+        # The cogs have flushed their stores by now
+        db_manager.close()
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from utils.extraction_cache import normalize_key
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+# A track is cached once it has started playing this many times
+DEFAULT_MIN_PLAYS = 2
+# Long mixes and streams are never worth keeping on disk
+MAX_CACHED_DURATION = 15 * 60
+# Transcodes running at once, each is one FFmpeg process
+MAX_CONCURRENT_TRANSCODES = 2
+
+CACHE_EXT = ".opus"
+TMP_EXT = ".tmp"
+INDEX_FILE = "index.json"
+
+
+class AudioCache:
+    """Size-bounded on-disk cache of frequently played tracks, stored as Opus.
+
+    Files are named after a hash of the track's page URL, and their mtime is
+    bumped on every hit so the least recently used files are evicted first,
+    also across restarts. Play counts are kept in a small index file.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = DEFAULT_MAX_BYTES, min_plays: int = DEFAULT_MIN_PLAYS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.min_plays = min_plays
+        self._play_counts: Dict[str, int] = {}
+        # key -> size in bytes, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._in_progress = set()
+        self._transcode_slots: Optional[asyncio.Semaphore] = None
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def key_for(webpage_url: str) -> str:
+        return hashlib.sha1(normalize_key(webpage_url).encode('utf-8')).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + CACHE_EXT)
+
+    def _scan(self):
+        files = []
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            if filename.endswith(TMP_EXT):
+                # Left over from an interrupted transcode
+                os.unlink(path)
+            elif filename.endswith(CACHE_EXT):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, filename[:-len(CACHE_EXT)], stat.st_size))
+        for _, key, size in sorted(files):
+            self._entries[key] = size
+
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding='utf-8') as f:
+                self._play_counts = json.load(f)
+        except (OSError, ValueError):
+            self._play_counts = {}
+        self._evict()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def contains(self, webpage_url: str) -> bool:
+        return self.key_for(webpage_url) in self._entries
+
+    def lookup(self, webpage_url: str) -> Optional[str]:
+        key = self.key_for(webpage_url)
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        path = self._path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            # Deleted behind our back
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def record_play(self, webpage_url: str, duration=None) -> bool:
+        # Counts a play; True when the track just became worth caching
+        key = self.key_for(webpage_url)
+        count = self._play_counts.get(key, 0) + 1
+        self._play_counts[key] = count
+        if key in self._entries or key in self._in_progress:
+            return False
+        if duration is None or duration > MAX_CACHED_DURATION:
+            return False
+        return count >= self.min_plays
+
+    async def store(self, webpage_url: str, stream_url: str):
+        # Transcodes stream_url to Opus in the background and adds it to the cache
+        key = self.key_for(webpage_url)
+        if key in self._entries or key in self._in_progress:
+            return
+        self._in_progress.add(key)
+        if self._transcode_slots is None:
+            self._transcode_slots = asyncio.Semaphore(MAX_CONCURRENT_TRANSCODES)
+        path = self._path(key)
+        tmp_path = path + TMP_EXT
+        try:
+            async with self._transcode_slots:
+                process = await asyncio.create_subprocess_exec(
+                    'ffmpeg', '-nostdin', '-loglevel', 'error', '-y',
+                    '-reconnect', '1', '-reconnect_streamed', '1', '-reconnect_delay_max', '5',
+                    '-i', stream_url,
+                    '-vn', '-c:a', 'libopus', '-b:a', '128k', '-f', 'opus', tmp_path,
+                    stdout=asyncio.subprocess.DEVNULL,
+                    stderr=asyncio.subprocess.PIPE
+                )
+                _, stderr = await process.communicate()
+            if process.returncode != 0:
+                print(f"Audio cache transcode failed for {webpage_url}: {stderr.decode(errors='replace').strip()}")
+                return
+            os.replace(tmp_path, path)
+            self._entries[key] = os.path.getsize(path)
+            self._evict()
+            await asyncio.get_running_loop().run_in_executor(None, self._write_index, self._prune_counts())
+        except Exception as e:
+            print(f"Audio cache transcode failed for {webpage_url}: {e}")
+        finally:
+            self._in_progress.discard(key)
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    def _evict(self):
+        total = self.total_bytes
+        while total > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            total -= size
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def _prune_counts(self) -> Dict[str, int]:
+        # Only counts for tracks that are not cached yet still matter; cap
+        # the rest so the index cannot grow without bound
+        counts = {key: count for key, count in self._play_counts.items() if key not in self._entries}
+        if len(counts) > 10000:
+            counts = dict(sorted(counts.items(), key=lambda item: item[1], reverse=True)[:10000])
+        self._play_counts = counts
+        return dict(counts)
+
+    def save_index(self):
+        self._write_index(self._prune_counts())
+
+    def _write_index(self, counts: Dict[str, int]):
+        tmp_path = os.path.join(self.directory, INDEX_FILE + TMP_EXT)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(counts, f)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self.total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'transcoding': len(self._in_progress),
+        }
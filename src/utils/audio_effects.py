@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+
+# Limits enforced on user-supplied settings
+MAX_GAIN_DB = 12.0
+MAX_BASS_BOOST_DB = 20.0
+MAX_CROSSFADE = 10.0
+
+# EBU R128 target used by loudness normalization
+LOUDNORM_FILTER = "loudnorm=I=-16:TP=-1.5:LRA=11"
+# Centre frequency and width of the bass shelf
+BASS_FILTER = "bass=g={gain:.1f}:f=110:w=0.6"
+
+
+class AudioEffects:
+    """Per-guild effect settings, rendered as an FFmpeg audio filter graph.
+
+    All processing happens inside the FFmpeg process that already decodes the
+    stream, so effects cost no Python time per 20 ms frame.
+    """
+
+    def __init__(self, gain_db: float = 0.0, normalize: bool = False, bass_boost_db: float = 0.0, crossfade: float = 0.0):
+        self.gain_db = max(-MAX_GAIN_DB, min(MAX_GAIN_DB, gain_db))
+        self.normalize = normalize
+        self.bass_boost_db = max(0.0, min(MAX_BASS_BOOST_DB, bass_boost_db))
+        # Seconds of fade-in at the start and fade-out at the end of each
+        # track. Every track is its own FFmpeg process, so this approximates a
+        # crossfade rather than overlapping two tracks.
+        self.crossfade = max(0.0, min(MAX_CROSSFADE, crossfade))
+
+    @property
+    def active(self) -> bool:
+        return bool(self.gain_db or self.normalize or self.bass_boost_db or self.crossfade)
+
+    def filter_chain(self, volume: float = 1.0, duration: Optional[float] = None) -> str:
+        # volume is linear (1.0 = unchanged); pass 1.0 when volume is applied elsewhere
+        filters = []
+        if self.bass_boost_db:
+            filters.append(BASS_FILTER.format(gain=self.bass_boost_db))
+        if self.normalize:
+            filters.append(LOUDNORM_FILTER)
+        gain = volume * 10 ** (self.gain_db / 20)
+        if abs(gain - 1.0) > 1e-3:
+            filters.append(f"volume={gain:.3f}")
+        if self.crossfade:
+            filters.append(f"afade=t=in:d={self.crossfade:.1f}")
+            if duration and duration > 2 * self.crossfade:
+                filters.append(f"afade=t=out:st={duration - self.crossfade:.1f}:d={self.crossfade:.1f}")
+        return ",".join(filters)
+
+    def to_dict(self) -> Dict:
+        return {
+            'gain_db': self.gain_db,
+            'normalize': self.normalize,
+            'bass_boost_db': self.bass_boost_db,
+            'crossfade': self.crossfade,
+        }
+
+    def describe(self) -> str:
+        if not self.active:
+            return "No effects."
+        parts = []
+        if self.gain_db:
+            parts.append(f"gain {self.gain_db:+.1f} dB")
+        if self.normalize:
+            parts.append("loudness normalization")
+        if self.bass_boost_db:
+            parts.append(f"bass boost {self.bass_boost_db:.1f} dB")
+        if self.crossfade:
+            parts.append(f"{self.crossfade:.1f}s fades")
+        return ", ".join(parts)
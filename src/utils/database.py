@@ -1,34 +1,41 @@
 import sqlite3
-import os
+import asyncio
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import REGISTRY
+from utils.tracing import bind, span
 
-class DatabaseManager:
-    def __init__(self, db_path):
-        self.db_path = db_path
-        self.create_user_table()
+# Number of long-lived reader connections (and reader threads) kept open.
+DEFAULT_READER_POOL_SIZE = 4
+# sqlite3 keeps compiled statements per connection; since connections are now
+# long-lived, every query below is prepared once and reused from this cache.
+STATEMENT_CACHE_SIZE = 128
+# Queue positions are spaced this far apart so an item can be moved between
+# two others by taking the midpoint, without renumbering the rest of the queue.
+POSITION_STEP = 1024
 
-    def get_connection(self):
-        return sqlite3.connect(self.db_path)
+DB_WAIT_SECONDS = REGISTRY.histogram(
+    'mozart_db_wait_seconds', "Time database calls waited for their thread and connection", ['method', 'pool']
+)
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'mozart_db_query_seconds', "Time database calls spent executing", ['method', 'pool']
+)
+DB_ERRORS = REGISTRY.counter('mozart_db_errors_total', "Database calls that raised", ['method'])
 
-    def create_user_table(self):
-        connection = self.get_connection()
-        cursor = connection.cursor()
-        
-        cursor = connection.cursor()
-        
-        # Optimize performance: Enable Write-Ahead Logging (WAL) and Normal Sync
-        cursor.execute("PRAGMA journal_mode=WAL;")
-        cursor.execute("PRAGMA synchronous=NORMAL;")
-        
-        cursor.execute("""
+# Schema history, applied in order and tracked with PRAGMA user_version.
+# Append new migrations to the end; never edit one that has shipped.
+MIGRATIONS = [
+    ("create base tables", [
+        """
             CREATE TABLE IF NOT EXISTS "users_per_guild" (
                 "user_id" INT,
                 "warnings_count" INT,
                 "guild_id" INT,
                 PRIMARY KEY("user_id","guild_id")
             )
-        """)
-        
-        cursor.execute("""
+        """,
+        """
             CREATE TABLE IF NOT EXISTS "music_queue" (
                 "id" INTEGER PRIMARY KEY AUTOINCREMENT,
                 "guild_id" INT,
@@ -40,199 +47,302 @@ class DatabaseManager:
                 "channel_id" INT,
                 "position" INT
             )
-        """)
-        connection.commit()
-        connection.close()
+        """,
+    ]),
+    ("index music_queue by guild and sparse position", [
+        # Every queue query filters on guild_id and orders by position
+        """
+            CREATE INDEX IF NOT EXISTS "idx_music_queue_guild_position"
+            ON "music_queue" ("guild_id", "position")
+        """,
+        # Re-space existing dense 1..N positions to multiples of POSITION_STEP
+        f"""
+            UPDATE music_queue
+            SET position = ranked.rank * {POSITION_STEP}
+            FROM (
+                SELECT id, ROW_NUMBER() OVER (PARTITION BY guild_id ORDER BY position, id) AS rank
+                FROM music_queue
+            ) AS ranked
+            WHERE music_queue.id = ranked.id
+        """,
+    ]),
+    ("add per-guild profanity words", [
+        # Terms are stored normalized (see utils.profanity.normalize)
+        """
+            CREATE TABLE IF NOT EXISTS "guild_profanity" (
+                "guild_id" INT,
+                "term" TEXT,
+                PRIMARY KEY("guild_id","term")
+            ) WITHOUT ROWID
+        """,
+    ]),
+    ("add whole-word flag to profanity words", [
+        # Terms match at the start of a word unless flagged
+        'ALTER TABLE "guild_profanity" ADD COLUMN "whole_word" INT NOT NULL DEFAULT 0',
+    ]),
+]
 
-    async def increase_and_get_warnings(self, user_id: int, guild_id: int):
-        import asyncio
-        loop = asyncio.get_running_loop()
-        
-        def _execute():
-            connection = self.get_connection()
-            cursor = connection.cursor()
-            
-            cursor.execute("""
-                SELECT warnings_count
-                FROM users_per_guild
-                WHERE (user_id = ?) AND (guild_id = ?);               
-            """,(user_id, guild_id))
-            
-            result = cursor.fetchone()
-            
-            if result == None:
-                cursor.execute("""
-                   INSERT INTO users_per_guild (user_id, warnings_count, guild_id)
-                   VALUES (?,1,?);            
-                """, (user_id, guild_id))
-                
-                new_warnings = 1
-            else:
-                new_warnings = result[0] + 1
-                cursor.execute("""
-                    UPDATE users_per_guild
-                    SET warnings_count = ?
-                    WHERE (user_id = ?) AND (guild_id = ?);      
-                    """,(new_warnings, user_id, guild_id)) 
-            
-            connection.commit()
-            connection.close()
-            return new_warnings
-
-        return await loop.run_in_executor(None, _execute)
-
-    # Music Queue Methods
-    async def add_to_queue(self, guild_id: int, song_data: dict):
-        import asyncio
-        import json
-        loop = asyncio.get_running_loop()
 
-        def _execute():
-            connection = self.get_connection()
-            cursor = connection.cursor()
-            
-            # Get next position
-            cursor.execute("SELECT MAX(position) FROM music_queue WHERE guild_id = ?", (guild_id,))
-            result = cursor.fetchone()
-            next_pos = (result[0] or 0) + 1
-            
-            # Use JSON to store complex dicts (like channel info which we can't fully store, so we store IDs)
-            # For simplicity, we'll store specific fields we need
-            
-            cursor.execute("""
-                INSERT INTO music_queue (guild_id, title, url, thumbnail, duration, requester, channel_id, position)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                guild_id, 
-                song_data.get('title'),
-                song_data.get('webpage_url'),
-                song_data.get('thumbnail'),
-                song_data.get('duration'),
-                song_data.get('requester'),
-                song_data['channel'].id if hasattr(song_data.get('channel'), 'id') else None,
-                next_pos
-            ))
-            
-            connection.commit()
-            connection.close()
-        
-        await loop.run_in_executor(None, _execute)
-
-    async def get_queue(self, guild_id: int):
-        import asyncio
+class DatabaseManager:
+    def __init__(self, db_path, reader_pool_size=DEFAULT_READER_POOL_SIZE):
+        self.db_path = db_path
+        self.migrate()
+
+        # A single writer connection pinned to a single thread serializes all
+        # writes (SQLite only allows one writer anyway), while WAL lets the
+        # reader pool query concurrently without blocking on it.
+        self._writer = self._open_connection()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+
+        self._readers = queue.Queue()
+        for _ in range(reader_pool_size):
+            self._readers.put(self._open_connection())
+        # One reader thread per pooled connection, so a checkout never waits
+        self._read_executor = ThreadPoolExecutor(max_workers=reader_pool_size, thread_name_prefix="db-reader")
+        self.reader_pool_size = reader_pool_size
+        # Calls submitted and not yet finished, i.e. executor queue depth plus
+        # the call in progress (only touched from the event loop)
+        self.pending_writes = 0
+        self.pending_reads = 0
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_path)
+
+    def _open_connection(self):
+        # Connections are created here but used from the executor threads
+        connection = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        connection.row_factory = sqlite3.Row
+        # synchronous is a per-connection setting, journal_mode is persistent
+        connection.execute("PRAGMA synchronous=NORMAL;")
+        connection.execute("PRAGMA busy_timeout=5000;")
+        return connection
+
+    @staticmethod
+    def _timed(fn, method: str, pool: str, submitted: float):
+        start = time.perf_counter()
+        DB_WAIT_SECONDS.observe(start - submitted, method, pool)
+        try:
+            with span(f"db.{method}", pool=pool, wait_ms=round((start - submitted) * 1000, 1)):
+                return fn()
+        except Exception:
+            DB_ERRORS.inc(method)
+            raise
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, method, pool)
+
+    async def _run_write(self, method: str, fn):
+        # Runs fn(connection) on the writer thread inside one transaction;
+        # method labels its metrics and trace span
         loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def _transaction():
+            with self._writer:
+                return fn(self._writer)
 
         def _execute():
-            connection = self.get_connection()
-            connection.row_factory = sqlite3.Row # Allow dict-like access
-            cursor = connection.cursor()
-            
-            cursor.execute("""
-                SELECT * FROM music_queue 
-                WHERE guild_id = ? 
-                ORDER BY position ASC
-            """, (guild_id,))
-            
-            rows = cursor.fetchall()
-            
-            queue = []
-            for row in rows:
-                queue.append({
-                    'id': row['id'],
-                    'title': row['title'],
-                    'webpage_url': row['url'],
-                    'thumbnail': row['thumbnail'],
-                    'duration': row['duration'],
-                    'requester': row['requester'],
-                    'channel_id': row['channel_id'] 
-                    # Note: We return channel_id, the Cog will need to resolve it to an object
-                })
-            
-            connection.close()
-            return queue
-
-        return await loop.run_in_executor(None, _execute)
-
-    async def pop_from_queue(self, guild_id: int):
-        import asyncio
+            # Timed including the commit
+            return self._timed(_transaction, method, 'write', submitted)
+
+        self.pending_writes += 1
+        try:
+            return await loop.run_in_executor(self._write_executor, bind(_execute))
+        finally:
+            self.pending_writes -= 1
+
+    async def _run_read(self, method: str, fn):
+        # Runs fn(connection) with a connection checked out of the reader pool
         loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
 
         def _execute():
-            connection = self.get_connection()
-            connection.row_factory = sqlite3.Row
+            connection = self._readers.get()
+            try:
+                return self._timed(lambda: fn(connection), method, 'read', submitted)
+            finally:
+                self._readers.put(connection)
+
+        self.pending_reads += 1
+        try:
+            return await loop.run_in_executor(self._read_executor, bind(_execute))
+        finally:
+            self.pending_reads -= 1
+
+    def stats(self):
+        return {
+            'reader_pool_size': self.reader_pool_size,
+            'pending_writes': self.pending_writes,
+            'pending_reads': self.pending_reads,
+        }
+
+    def close(self):
+        self._write_executor.shutdown(wait=True)
+        self._read_executor.shutdown(wait=True)
+        self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+    def migrate(self):
+        connection = self.get_connection()
+        # Manage transactions explicitly so each migration is all-or-nothing
+        connection.isolation_level = None
+        cursor = connection.cursor()
+
+        # Optimize performance: Enable Write-Ahead Logging (WAL) and Normal Sync
+        cursor.execute("PRAGMA journal_mode=WAL;")
+        cursor.execute("PRAGMA synchronous=NORMAL;")
+
+        version = cursor.execute("PRAGMA user_version;").fetchone()[0]
+        for target, (description, statements) in enumerate(MIGRATIONS[version:], version + 1):
+            try:
+                cursor.execute("BEGIN")
+                for statement in statements:
+                    cursor.execute(statement)
+                cursor.execute(f"PRAGMA user_version = {target};")
+                cursor.execute("COMMIT")
+            except sqlite3.Error:
+                cursor.execute("ROLLBACK")
+                print(f"Database migration {target} ({description}) failed")
+                raise
+        connection.close()
+
+    @staticmethod
+    def _row_to_item(row):
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'webpage_url': row['url'],
+            'thumbnail': row['thumbnail'],
+            'duration': row['duration'],
+            'requester': row['requester'],
+            'channel_id': row['channel_id']
+            # Note: We return channel_id, the Cog will need to resolve it to an object
+        }
+
+    async def increase_and_get_warnings(self, user_id: int, guild_id: int):
+        def _execute(connection):
+            # One atomic statement instead of SELECT then INSERT/UPDATE
+            row = connection.execute("""
+                INSERT INTO users_per_guild (user_id, warnings_count, guild_id)
+                VALUES (?, 1, ?)
+                ON CONFLICT (user_id, guild_id)
+                DO UPDATE SET warnings_count = warnings_count + 1
+                RETURNING warnings_count
+            """, (user_id, guild_id)).fetchone()
+            return row[0]
+
+        return await self._run_write('increase_and_get_warnings', _execute)
+
+    async def add_warnings(self, deltas):
+        # Write-behind support for utils.strike_counter.StrikeCounter:
+        # deltas is [(user_id, guild_id, added_warnings)], applied in one transaction
+        def _execute(connection):
+            connection.executemany("""
+                INSERT INTO users_per_guild (user_id, warnings_count, guild_id)
+                VALUES (?, ?, ?)
+                ON CONFLICT (user_id, guild_id)
+                DO UPDATE SET warnings_count = warnings_count + excluded.warnings_count
+            """, [(user_id, added, guild_id) for user_id, guild_id, added in deltas])
+
+        await self._run_write('add_warnings', _execute)
+
+    # Profanity Word List Methods
+    async def load_profanity_terms(self):
+        # Every guild's custom terms in one scan, as {guild_id: {term: whole_word}}
+        def _execute(connection):
+            terms = {}
+            for row in connection.execute("SELECT guild_id, term, whole_word FROM guild_profanity"):
+                terms.setdefault(row['guild_id'], {})[row['term']] = bool(row['whole_word'])
+            return terms
+
+        return await self._run_read('load_profanity_terms', _execute)
+
+    async def add_profanity_terms(self, guild_id: int, terms, whole_word: bool = False):
+        # Adding a listed term again updates its whole-word flag
+        def _execute(connection):
+            cursor = connection.executemany(
+                """
+                    INSERT INTO guild_profanity (guild_id, term, whole_word) VALUES (?, ?, ?)
+                    ON CONFLICT (guild_id, term) DO UPDATE SET whole_word = excluded.whole_word
+                """,
+                [(guild_id, term, int(whole_word)) for term in terms]
+            )
+            return cursor.rowcount
+
+        return await self._run_write('add_profanity_terms', _execute)
+
+    async def remove_profanity_terms(self, guild_id: int, terms):
+        def _execute(connection):
+            cursor = connection.executemany(
+                "DELETE FROM guild_profanity WHERE guild_id = ? AND term = ?",
+                [(guild_id, term) for term in terms]
+            )
+            return cursor.rowcount
+
+        return await self._run_write('remove_profanity_terms', _execute)
+
+    # Write-behind support for utils.queue_store.QueueStore
+    async def load_queues(self):
+        def _execute(connection):
             cursor = connection.cursor()
-            
-            # Get the first item
+            cursor.execute("SELECT * FROM music_queue ORDER BY guild_id, position ASC")
+            items = []
+            for row in cursor.fetchall():
+                item = self._row_to_item(row)
+                item['guild_id'] = row['guild_id']
+                item['position'] = row['position']
+                items.append(item)
+
+            # AUTOINCREMENT never reuses ids, so honour its sequence too
             cursor.execute("""
-                SELECT * FROM music_queue 
-                WHERE guild_id = ? 
-                ORDER BY position ASC 
-                LIMIT 1
-            """, (guild_id,))
-            
-            row = cursor.fetchone()
-            
-            if row:
-                # Delete it
-                cursor.execute("DELETE FROM music_queue WHERE id = ?", (row['id'],))
-                connection.commit()
-                
-                # Retrieve data
-                item = {
-                    'id': row['id'],
-                    'title': row['title'],
-                    'webpage_url': row['url'],
-                    'thumbnail': row['thumbnail'],
-                    'duration': row['duration'],
-                    'requester': row['requester'],
-                    'channel_id': row['channel_id']
-                }
-                connection.close()
-                return item
-            
-            connection.close()
-            return None
-
-        return await loop.run_in_executor(None, _execute)
-
-    async def clear_queue(self, guild_id: int):
-        import asyncio
-        loop = asyncio.get_running_loop()
+                SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'music_queue'), 0),
+                           COALESCE((SELECT MAX(id) FROM music_queue), 0))
+            """)
+            return items, cursor.fetchone()[0]
 
-        def _execute():
-            connection = self.get_connection()
-            cursor = connection.cursor()
-            cursor.execute("DELETE FROM music_queue WHERE guild_id = ?", (guild_id,))
-            connection.commit()
-            connection.close()
-
-        await loop.run_in_executor(None, _execute)
-        
-    async def shuffle_queue(self, guild_id: int):
-        import asyncio
-        import random
-        loop = asyncio.get_running_loop()
+        return await self._run_read('load_queues', _execute)
 
-        def _execute():
-            connection = self.get_connection()
-            cursor = connection.cursor()
-            
-            # Get all IDs for this guild
-            cursor.execute("SELECT id FROM music_queue WHERE guild_id = ? ORDER BY position ASC", (guild_id,))
-            ids = [row[0] for row in cursor.fetchall()]
-            
-            if not ids:
-                connection.close()
-                return
-
-            # Shuffle the positions, but keep IDs the same (effectively reordering)
-            # Actually, simpler: just shuffle the order of IDs and re-assign positions 1..N
-            random.shuffle(ids)
-            
-            for index, row_id in enumerate(ids):
-                cursor.execute("UPDATE music_queue SET position = ? WHERE id = ?", (index + 1, row_id))
-            
-            connection.commit()
-            connection.close()
-
-        await loop.run_in_executor(None, _execute)
+    async def apply_queue_ops(self, ops):
+        from itertools import groupby
+
+        statements = {
+            'insert': """
+                INSERT INTO music_queue (id, guild_id, title, url, thumbnail, duration, requester, channel_id, position)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            'delete': "DELETE FROM music_queue WHERE id = ?",
+            'clear': "DELETE FROM music_queue WHERE guild_id = ?",
+            'reposition': "UPDATE music_queue SET position = ? WHERE id = ?",
+        }
+
+        def _params(op):
+            kind = op[0]
+            if kind == 'insert':
+                _, guild_id, item = op
+                return [(
+                    item['id'],
+                    guild_id,
+                    item['title'],
+                    item['webpage_url'],
+                    item['thumbnail'],
+                    item['duration'],
+                    item['requester'],
+                    item['channel_id'],
+                    item['position']
+                )]
+            if kind == 'reposition':
+                return op[1]
+            return [(op[1],)]
+
+        def _execute(connection):
+            # Consecutive ops of the same kind become one executemany call;
+            # the whole batch is a single transaction
+            for kind, group in groupby(ops, key=lambda op: op[0]):
+                params = [p for op in group for p in _params(op)]
+                connection.executemany(statements[kind], params)
+
+        await self._run_write('apply_queue_ops', _execute)
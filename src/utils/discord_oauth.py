@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DEFAULT_API_ENDPOINT = "https://discord.com/api/v10"
+# (connect, read) seconds; a hung upstream must not hold a web worker for long
+DEFAULT_TIMEOUT = (3.05, 10)
+# Retries after the first attempt, spaced BACKOFF * 2**n seconds apart
+DEFAULT_RETRIES = 3
+RETRY_BACKOFF = 0.3
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# /users/@me results are reused for this long, per access token
+USER_CACHE_TTL = 300
+USER_CACHE_SIZE = 1024
+
+
+class OAuthError(Exception):
+    pass
+
+
+class DiscordOAuthClient:
+    """Shared, keep-alive HTTP client for the dashboard's Discord login.
+
+    One ``requests.Session`` (for the threaded web tier) and one lazily
+    created ``aiohttp.ClientSession`` (for the async tier) keep TLS
+    connections to Discord open between logins. Every call has a timeout,
+    transient failures are retried with backoff, and ``/users/@me`` results
+    are cached per access token.
+
+    The token exchange is only retried when the request never reached
+    Discord: authorization codes are single-use.
+    """
+
+    def __init__(
+        self,
+        api_endpoint: str = DEFAULT_API_ENDPOINT,
+        pool_size: int = 10,
+        timeout=DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        user_cache_ttl: float = USER_CACHE_TTL,
+    ):
+        self.api_endpoint = api_endpoint.rstrip('/')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.user_cache_ttl = user_cache_ttl
+        self._user_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            backoff_factor=RETRY_BACKOFF,
+            status_forcelist=RETRY_STATUSES,
+            # Reads and status codes are retried for GET only; connection
+            # errors (nothing was sent) are retried for every method
+            allowed_methods=frozenset({'GET'}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._async_session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    def token_payload(client_id: str, client_secret: str, code: str, redirect_uri: str) -> Dict:
+        return {
+            'client_id': client_id,
+            'client_secret': client_secret,
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': redirect_uri,
+            'scope': 'identify'
+        }
+
+    @staticmethod
+    def _cache_key(access_token: str) -> str:
+        # Tokens are credentials; only their hash is kept in memory
+        return hashlib.sha256(access_token.encode('utf-8')).hexdigest()
+
+    def _cached_user(self, access_token: str) -> Optional[Dict]:
+        key = self._cache_key(access_token)
+        with self._cache_lock:
+            entry = self._user_cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._user_cache.move_to_end(key)
+                self.cache_hits += 1
+                return entry[1]
+            self._user_cache.pop(key, None)
+            self.cache_misses += 1
+        return None
+
+    def _cache_user(self, access_token: str, user: Dict):
+        with self._cache_lock:
+            self._user_cache[self._cache_key(access_token)] = (time.monotonic() + self.user_cache_ttl, user)
+            while len(self._user_cache) > USER_CACHE_SIZE:
+                self._user_cache.popitem(last=False)
+
+    # --- Threaded tier ---
+
+    def exchange_code(self, client_id: str, client_secret: str, code: str, redirect_uri: str) -> Dict:
+        r = self.session.post(
+            f'{self.api_endpoint}/oauth2/token',
+            data=self.token_payload(client_id, client_secret, code, redirect_uri),
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=self.timeout
+        )
+        r.raise_for_status()
+        return r.json()
+
+    def get_user(self, access_token: str) -> Dict:
+        user = self._cached_user(access_token)
+        if user is not None:
+            return user
+        r = self.session.get(
+            f'{self.api_endpoint}/users/@me',
+            headers={'Authorization': f"Bearer {access_token}"},
+            timeout=self.timeout
+        )
+        r.raise_for_status()
+        user = r.json()
+        self._cache_user(access_token, user)
+        return user
+
+    # --- Async tier ---
+
+    def _get_async_session(self) -> aiohttp.ClientSession:
+        if self._async_session is None or self._async_session.closed:
+            connect, read = self.timeout
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read, total=connect + read)
+            )
+        return self._async_session
+
+    async def _request_async(self, method: str, path: str, idempotent: bool, **kwargs) -> Dict:
+        session = self._get_async_session()
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                async with session.request(method, f'{self.api_endpoint}{path}', **kwargs) as r:
+                    if idempotent and r.status in RETRY_STATUSES and not last:
+                        try:
+                            delay = float(r.headers['Retry-After'])
+                        except (KeyError, ValueError):
+                            delay = RETRY_BACKOFF * 2 ** attempt
+                        await asyncio.sleep(delay)
+                        continue
+                    r.raise_for_status()
+                    return await r.json()
+            except aiohttp.ClientConnectorError:
+                # Never connected, so nothing was sent; safe for any method
+                if last:
+                    raise
+            except asyncio.TimeoutError:
+                if not idempotent or last:
+                    raise
+            await asyncio.sleep(RETRY_BACKOFF * 2 ** attempt)
+        raise OAuthError(f"{method} {path} failed after {self.retries + 1} attempts")
+
+    async def exchange_code_async(self, client_id: str, client_secret: str, code: str, redirect_uri: str) -> Dict:
+        return await self._request_async(
+            'POST', '/oauth2/token', idempotent=False,
+            data=self.token_payload(client_id, client_secret, code, redirect_uri)
+        )
+
+    async def get_user_async(self, access_token: str) -> Dict:
+        user = self._cached_user(access_token)
+        if user is not None:
+            return user
+        user = await self._request_async(
+            'GET', '/users/@me', idempotent=True,
+            headers={'Authorization': f"Bearer {access_token}"}
+        )
+        self._cache_user(access_token, user)
+        return user
+
+    def stats(self) -> Dict:
+        return {
+            # The /users/@me cache; same keys as the other caches' stats
+            'entries': len(self._user_cache),
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+        }
+
+    async def close_async(self):
+        if self._async_session is not None:
+            await self._async_session.close()
+
+    def close(self):
+        self.session.close()
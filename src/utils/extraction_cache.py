@@ -0,0 +1,138 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs, urlencode, urlparse, urlunparse
+
+DEFAULT_MAX_ENTRIES = 1024
+# Assumed lifetime of a stream URL that carries no expiry of its own
+DEFAULT_STREAM_URL_TTL = 30 * 60
+# Search results only map a query to a video page, which stays valid for a
+# long time; the signed stream URL is cached separately with its own expiry
+SEARCH_TTL = 6 * 60 * 60
+
+
+def stream_url_expiry(stream_url: str) -> float:
+    # Signed media URLs carry their expiry as a unix timestamp, e.g.
+    # googlevideo's "expire" and CloudFront's "Expires" query parameters
+    query = parse_qs(urlparse(stream_url).query)
+    for key in ('expire', 'Expires'):
+        try:
+            return float(query[key][0])
+        except (KeyError, IndexError, ValueError):
+            continue
+    return time.time() + DEFAULT_STREAM_URL_TTL
+
+
+def normalize_key(query: str) -> str:
+    # The same song requested as "Never Gonna  Give you up", a youtu.be link or
+    # a watch URL with tracking parameters should share one cache entry
+    query = query.strip()
+    parsed = urlparse(query)
+    if parsed.scheme not in ('http', 'https') or not parsed.netloc:
+        return ' '.join(query.casefold().split())
+
+    host = parsed.netloc.lower()
+    if host.startswith('www.') or host.startswith('m.'):
+        host = host.split('.', 1)[1]
+    if host == 'youtu.be':
+        return f"https://youtube.com/watch?v={parsed.path.lstrip('/')}"
+    if host in ('youtube.com', 'music.youtube.com') and parsed.path == '/watch':
+        video_id = parse_qs(parsed.query).get('v', [''])[0]
+        return f"https://youtube.com/watch?v={video_id}"
+    # Keep the query (it may select the content) but drop the fragment
+    query_string = urlencode(sorted(parse_qs(parsed.query).items()), doseq=True)
+    return urlunparse(('https', host, parsed.path.rstrip('/'), '', query_string, ''))
+
+
+class ExtractionCache:
+    """Thread-safe LRU cache of yt-dlp results with per-entry expiry.
+
+    Entries are keyed by (kind, normalized query or URL), so e.g. search
+    results and resolved stream URLs live side by side. Optionally persisted
+    as JSON so a restart does not start cold.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, persist_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def _key(kind: str, query: str) -> str:
+        return f"{kind}:{normalize_key(query)}"
+
+    def get(self, kind: str, query: str) -> Optional[Dict[str, Any]]:
+        key = self._key(kind, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, kind: str, query: str, value: Dict[str, Any], expires_at: float):
+        if expires_at <= time.time():
+            return
+        key = self._key(kind, query)
+        with self._lock:
+            self._entries[key] = (expires_at, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def load(self):
+        try:
+            with open(self.persist_path, encoding='utf-8') as f:
+                stored = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable extraction cache {self.persist_path}: {e}")
+            return
+
+        now = time.time()
+        with self._lock:
+            # Stored least recently used first, so insertion order is LRU order
+            for key, expires_at, value in stored:
+                if expires_at > now:
+                    self._entries[key] = (expires_at, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        if not self.persist_path:
+            return
+        now = time.time()
+        with self._lock:
+            stored = [[key, expires_at, value] for key, (expires_at, value) in self._entries.items() if expires_at > now]
+        # Write to a temp file first so a crash never leaves a truncated cache
+        tmp_path = f"{self.persist_path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.persist_path)
+        except OSError as e:
+            print(f"Failed to save extraction cache: {e}")
@@ -0,0 +1,179 @@
+import asyncio
+import enum
+from typing import Awaitable, Callable, Optional
+
+# Failed starts in a row before the player gives up until something new is queued
+MAX_CONSECUTIVE_FAILURES = 5
+# Delay before retrying after the n-th failure in a row: BASE * 2**(n-1), capped
+RETRY_BACKOFF_BASE = 0.5
+RETRY_BACKOFF_MAX = 8.0
+# Upper bound on resolving and starting a single track
+TRACK_START_TIMEOUT = 45
+# A track that ends on its own sooner than this (not skipped) is treated as
+# broken, so a dead stream cannot be replayed in a tight loop
+MIN_PLAY_SECONDS = 1.0
+
+
+class PlayerState(enum.Enum):
+    IDLE = 'idle'          # nothing playing, waiting for songs
+    STARTING = 'starting'  # resolving and starting the next track
+    PLAYING = 'playing'    # a track is playing or paused
+    BACKOFF = 'backoff'    # the last start failed, retrying after a delay
+    STOPPED = 'stopped'    # shut down, no longer processes events
+
+
+class PlayerEvent(enum.Enum):
+    ENQUEUED = 'enqueued'
+    TRACK_ENDED = 'track_ended'
+    SKIP = 'skip'
+    STOP = 'stop'
+
+
+class GuildPlayer:
+    """Drives playback for one guild from a queue of events.
+
+    A single task per guild owns every transition, so a track ending, a skip
+    and a /play arriving together are handled one after another instead of
+    each scheduling its own coroutine. Failed starts are retried with
+    exponential backoff and a bounded budget.
+
+    ``start_next(after)`` starts the next track with ``after`` as the voice
+    client's ``after`` callback and returns False when there is nothing to
+    play; it raises when the track cannot be played. ``stop_playback`` stops
+    the current track and ``track_finished`` runs when one ends normally.
+    """
+
+    def __init__(
+        self,
+        guild_id: int,
+        start_next: Callable[[Callable], Awaitable[bool]],
+        stop_playback: Callable[[], None],
+        track_finished: Optional[Callable[[], None]] = None,
+    ):
+        self.guild_id = guild_id
+        self._start_next = start_next
+        self._stop_playback = stop_playback
+        self._track_finished = track_finished
+        self.state = PlayerState.IDLE
+        self.failures = 0
+        self.tracks_started = 0
+        self._events: asyncio.Queue = asyncio.Queue()
+        # Bumped for every start so callbacks of earlier tracks can be told apart
+        self._generation = 0
+        self._skipped_generation = None
+        self._started_at = 0.0
+        self._retry_at = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run(), name=f"player-{self.guild_id}")
+
+    def post(self, event: PlayerEvent, generation: Optional[int] = None, error=None):
+        # Event loop thread only; use post_threadsafe from anywhere else
+        if self.state is not PlayerState.STOPPED:
+            self._events.put_nowait((event, generation, error))
+
+    def post_threadsafe(self, event: PlayerEvent, generation: Optional[int] = None, error=None):
+        try:
+            self._loop.call_soon_threadsafe(self.post, event, generation, error)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    async def stop(self):
+        self.post(PlayerEvent.STOP)
+        if not self._task:
+            return
+        if self.state is PlayerState.STARTING:
+            # Don't wait for a slow extraction just to throw its result away
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.state = PlayerState.STOPPED
+
+    def _after_callback(self, generation: int):
+        # Runs on the audio player thread when the track ends or is stopped
+        def after(error):
+            self.post_threadsafe(PlayerEvent.TRACK_ENDED, generation, error)
+        return after
+
+    async def _run(self):
+        while True:
+            timeout = None
+            if self.state is PlayerState.BACKOFF:
+                timeout = max(0.0, self._retry_at - self._loop.time())
+            try:
+                event, generation, error = await asyncio.wait_for(self._events.get(), timeout)
+            except asyncio.TimeoutError:
+                await self._advance()
+                continue
+
+            if event is PlayerEvent.STOP:
+                self.state = PlayerState.STOPPED
+                return
+
+            if event is PlayerEvent.SKIP:
+                if self.state is PlayerState.PLAYING:
+                    self._skipped_generation = self._generation
+                    # The resulting TRACK_ENDED moves on to the next song
+                    self._stop_playback()
+                continue
+
+            if event is PlayerEvent.TRACK_ENDED:
+                if self.state is not PlayerState.PLAYING or generation != self._generation:
+                    # Callback of a track we already moved past
+                    continue
+                skipped = self._skipped_generation == generation
+                played = self._loop.time() - self._started_at
+                if error or (not skipped and played < MIN_PLAY_SECONDS):
+                    self._fail(error or f"track ended after {played:.2f}s")
+                    continue
+                # Played properly, so the failure streak is over
+                self.failures = 0
+                if self._track_finished:
+                    self._track_finished()
+                self.state = PlayerState.IDLE
+            elif event is PlayerEvent.ENQUEUED:
+                if self.state is not PlayerState.IDLE:
+                    # Already playing or about to retry; the new song waits its turn
+                    continue
+                # New songs get a fresh retry budget
+                self.failures = 0
+
+            await self._advance()
+
+    async def _advance(self):
+        self.state = PlayerState.STARTING
+        self._generation += 1
+        try:
+            started = await asyncio.wait_for(
+                self._start_next(self._after_callback(self._generation)), TRACK_START_TIMEOUT
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail(e)
+            return
+
+        if started:
+            self.state = PlayerState.PLAYING
+            self._started_at = self._loop.time()
+            self.tracks_started += 1
+        else:
+            self.state = PlayerState.IDLE
+            self.failures = 0
+
+    def _fail(self, error):
+        self.failures += 1
+        print(f"Player {self.guild_id}: track failed ({self.failures}/{MAX_CONSECUTIVE_FAILURES}): {error}")
+        if self.failures >= MAX_CONSECUTIVE_FAILURES:
+            print(f"Player {self.guild_id}: giving up until something new is queued")
+            self.state = PlayerState.IDLE
+            return
+        delay = min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** (self.failures - 1))
+        self._retry_at = self._loop.time() + delay
+        self.state = PlayerState.BACKOFF
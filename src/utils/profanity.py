@@ -0,0 +1,92 @@
+import re
+import unicodedata
+from typing import Iterable, Optional
+
+# Common character substitutions, applied after case folding
+LEET_TABLE = str.maketrans({
+    '0': 'o',
+    '1': 'i',
+    '3': 'e',
+    '4': 'a',
+    '5': 's',
+    '7': 't',
+    '8': 'b',
+    '@': 'a',
+    '$': 's',
+})
+# Also punctuation (and spoiler bars), so these only count inside a word:
+# "sh!t" but not "you!" or "||spoiler||"
+_LEET_PUNCTUATION = re.compile(r'(?<=\w)[!|+](?=\w)')
+_LEET_PUNCTUATION_TABLE = {'!': 'i', '|': 'i', '+': 't'}
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize(text: str) -> str:
+    # Compatibility decomposition folds fullwidth and styled letters
+    # (𝐟𝐮𝐜𝐤, ｆｕｃｋ) to ASCII and splits accents off so they can be dropped
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = text.casefold()
+    text = _LEET_PUNCTUATION.sub(lambda m: _LEET_PUNCTUATION_TABLE[m.group(0)], text)
+    text = text.translate(LEET_TABLE)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    # Turns the word list into one regex shaped like a prefix trie, e.g.
+    # ["bad", "bat", "bats"] -> ba(?:d|ts?). The regex engine then walks a
+    # single branch per character instead of trying every term in turn.
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def _build(node) -> str:
+        branches = [re.escape(ch) + _build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        if len(branches) == 1 and '' not in node:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if '' in node else pattern
+
+    return _build(trie)
+
+
+class ProfanityMatcher:
+    """Finds any of a fixed set of terms in a message with one regex search.
+
+    Terms and messages go through the same ``normalize`` (Unicode folding,
+    case folding, leetspeak). Terms match at the start of a word, so
+    "class" does not trip on "ass" while inflected and stretched forms
+    ("fuckers", "fuck youuu") still count. ``whole_words`` must also end
+    the word, for terms that otherwise start innocent words ("ass" in
+    "assist"). Build once per word list and reuse.
+    """
+
+    def __init__(self, terms: Iterable[str], whole_words: Iterable[str] = ()):
+        self.terms = frozenset(filter(None, (normalize(term) for term in terms)))
+        # A term listed both ways matches the broader way
+        self.whole_words = frozenset(filter(None, (normalize(term) for term in whole_words))) - self.terms
+        branches = []
+        if self.terms:
+            branches.append(_trie_pattern(self.terms))
+        if self.whole_words:
+            branches.append('(?:' + _trie_pattern(self.whole_words) + r')(?!\w)')
+        if branches:
+            self._regex = re.compile(r'(?<!\w)(?:' + '|'.join(branches) + ')')
+        else:
+            self._regex = None
+
+    def __len__(self):
+        return len(self.terms) + len(self.whole_words)
+
+    def search(self, text: str) -> Optional[str]:
+        # Returns the (normalized) term found in text, or None
+        if self._regex is None:
+            return None
+        match = self._regex.search(normalize(text))
+        return match.group(0) if match else None
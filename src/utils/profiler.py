@@ -0,0 +1,104 @@
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+# Seconds between stack samples; py-spy's default rate is 100 Hz
+SAMPLE_INTERVAL = 0.01
+MAX_PROFILE_SECONDS = 60
+# Functions listed in a cProfile report
+PSTATS_LIMIT = 60
+
+# One profile at a time; they are not free and would skew each other
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _check_seconds(seconds: float):
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"A profile must last more than 0 and at most {MAX_PROFILE_SECONDS} seconds")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"
+
+
+def sample_stacks(seconds: float, interval: float = SAMPLE_INTERVAL) -> str:
+    """Samples the stacks of every thread for ``seconds``.
+
+    Returns folded stacks ("thread;outer;...;inner count" per line), the
+    format of ``py-spy record --format raw``, which flamegraph.pl and
+    speedscope read directly. Blocking; call it from a worker thread.
+    """
+    _check_seconds(seconds)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        counts = Counter()
+        me = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(f"thread {names.get(ident, ident)}")
+                counts[tuple(reversed(stack))] += 1
+            time.sleep(interval)
+    finally:
+        _profile_lock.release()
+    return '\n'.join(f"{';'.join(stack)} {count}" for stack, count in counts.most_common()) + '\n'
+
+
+def profile_loop(loop, seconds: float) -> str:
+    """Runs cProfile on the event loop's thread for ``seconds``.
+
+    That thread runs all of the bot's own Python code (commands, events,
+    the players), so this is where deterministic call counts and timings
+    are most useful. Returns a pstats report sorted by cumulative time.
+    Blocking; must not be called from the loop's thread.
+    """
+    _check_seconds(seconds)
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running")
+    try:
+        profiler = cProfile.Profile()
+        enabled = threading.Event()
+        disabled = threading.Event()
+
+        def _enable():
+            profiler.enable()
+            enabled.set()
+
+        def _disable():
+            profiler.disable()
+            disabled.set()
+
+        loop.call_soon_threadsafe(_enable)
+        try:
+            if not enabled.wait(5):
+                raise RuntimeError("The event loop did not respond")
+            time.sleep(seconds)
+        finally:
+            # Always queued behind _enable, which may still run after a
+            # timed-out wait, so the profiler never stays on
+            loop.call_soon_threadsafe(_disable)
+            disabled.wait(5)
+    finally:
+        _profile_lock.release()
+
+    out = io.StringIO()
+    stats = pstats.Stats(profiler, stream=out)
+    stats.sort_stats('cumulative').print_stats(PSTATS_LIMIT)
+    return out.getvalue()
@@ -0,0 +1,256 @@
+import asyncio
+import random
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from utils.database import POSITION_STEP
+
+# How long mutations are collected before being written out as one batch.
+# This is also the worst-case window of queue changes lost on a hard crash.
+FLUSH_INTERVAL = 0.5
+# A batch that fails this many times in a row is dropped, so one bad
+# operation cannot hold back every later change; retries back off doubling
+# from FLUSH_INTERVAL
+MAX_FLUSH_ATTEMPTS = 5
+
+
+class QueueStore:
+    """In-memory per-guild music queues, persisted to SQLite via write-behind.
+
+    Reads never touch the database. Every mutation updates the deque right away
+    and appends an operation to a pending log, which a background task writes
+    to ``music_queue`` in a single transaction. On startup the queues are
+    rehydrated from the table, so the queue still survives restarts.
+    """
+
+    def __init__(self, db, flush_interval: float = FLUSH_INTERVAL):
+        self.db = db
+        self.flush_interval = flush_interval
+        self._queues: Dict[int, Deque[Dict]] = {}
+        self._pending: List[tuple] = []
+        # A batch that failed to write, retried on its own ahead of _pending
+        self._retry: List[tuple] = []
+        self._attempts = 0
+        # Row ids are assigned here (not by SQLite) so items are addressable
+        # (e.g. by the dashboard's remove button) before they are flushed
+        self._next_id = 1
+        # Set by partition() when other processes share the table
+        self._shards = None
+        self._id_step = 1
+        self._dirty: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def partition(self, shard_count: int, shard_ids):
+        # Only this process's shards are loaded, and ids are handed out from
+        # a residue class of shard_count (picked by the lowest shard id), so
+        # processes owning disjoint shards never allocate the same id
+        self._shards = (shard_count, frozenset(shard_ids))
+        self._id_step = shard_count
+
+    def owns(self, guild_id: int) -> bool:
+        if self._shards is None:
+            return True
+        shard_count, shard_ids = self._shards
+        # Discord's shard formula
+        return (guild_id >> 22) % shard_count in shard_ids
+
+    async def load(self):
+        rows, max_id = await self.db.load_queues()
+        self._queues.clear()
+        for row in rows:
+            guild_id = row.pop('guild_id')
+            if self.owns(guild_id):
+                self._queues.setdefault(guild_id, deque()).append(row)
+        self._next_id = max_id + 1
+        if self._shards is not None:
+            offset = min(self._shards[1])
+            self._next_id += (offset - self._next_id) % self._id_step
+
+    def start(self):
+        if self._flush_task is None:
+            self._dirty = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await self._dirty.wait()
+            # Give bursts of mutations (e.g. a shuffle after an enqueue) a
+            # moment to accumulate so they share one transaction
+            await asyncio.sleep(self.flush_interval * 2 ** self._attempts)
+            self._dirty.clear()
+            await self.flush()
+
+    async def flush(self):
+        while self._retry or self._pending:
+            # Keep ordering intact: the failed batch goes before anything newer
+            if self._retry:
+                ops, self._retry = self._retry, []
+            else:
+                ops, self._pending = self._pending, []
+            try:
+                await self.db.apply_queue_ops(ops)
+            except Exception as e:
+                self._attempts += 1
+                if self._attempts < MAX_FLUSH_ATTEMPTS:
+                    print(f"Failed to persist queue changes (attempt {self._attempts}/{MAX_FLUSH_ATTEMPTS}), will retry: {e}")
+                    self._retry = ops
+                    if self._dirty:
+                        self._dirty.set()
+                    return
+                print(f"Dropping {len(ops)} queue changes after {self._attempts} failed attempts: {e} (ops: {ops!r:.500})")
+            self._attempts = 0
+
+    def _log(self, *op):
+        self._pending.append(op)
+        if self._dirty:
+            self._dirty.set()
+
+    # Reads
+
+    def get(self, guild_id: int) -> List[Dict]:
+        # Copies, so callers can annotate items (e.g. resolve 'channel')
+        return [dict(item) for item in self._queues.get(guild_id, ())]
+
+    def peek(self, guild_id: int) -> Optional[Dict]:
+        queue = self._queues.get(guild_id)
+        return dict(queue[0]) if queue else None
+
+    def length(self, guild_id: int) -> int:
+        return len(self._queues.get(guild_id, ()))
+
+    # Mutations
+
+    def append(self, guild_id: int, song_data: Dict) -> Dict:
+        queue = self._queues.setdefault(guild_id, deque())
+        channel = song_data.get('channel')
+        item = {
+            'id': self._next_id,
+            'title': song_data.get('title'),
+            'webpage_url': song_data.get('webpage_url'),
+            'thumbnail': song_data.get('thumbnail'),
+            'duration': song_data.get('duration'),
+            'requester': song_data.get('requester'),
+            'channel_id': channel.id if hasattr(channel, 'id') else song_data.get('channel_id'),
+            'position': (queue[-1]['position'] if queue else 0) + POSITION_STEP
+        }
+        self._next_id += self._id_step
+        queue.append(item)
+        self._log('insert', guild_id, item)
+        return dict(item)
+
+    def extend(self, guild_id: int, songs: List[Dict]) -> List[Dict]:
+        # Consecutive inserts are flushed together as one executemany
+        return [self.append(guild_id, song_data) for song_data in songs]
+
+    def pop(self, guild_id: int) -> Optional[Dict]:
+        queue = self._queues.get(guild_id)
+        if not queue:
+            return None
+        item = queue.popleft()
+        self._log('delete', item['id'])
+        return dict(item)
+
+    def remove(self, guild_id: int, song_id: int) -> bool:
+        queue = self._queues.get(guild_id)
+        if not queue:
+            return False
+        for item in queue:
+            if item['id'] == song_id:
+                queue.remove(item)
+                self._log('delete', song_id)
+                return True
+        return False
+
+    def clear(self, guild_id: int):
+        self._queues.pop(guild_id, None)
+        self._log('clear', guild_id)
+
+    def shuffle(self, guild_id: int):
+        queue = self._queues.get(guild_id)
+        if not queue:
+            return
+        items = list(queue)
+        random.shuffle(items)
+        self._reorder(guild_id, items)
+
+    def reverse(self, guild_id: int):
+        queue = self._queues.get(guild_id)
+        if queue:
+            self._reorder(guild_id, reversed(queue))
+
+    def sort(self, guild_id: int, key: str):
+        # Stable sort on 'duration' or 'requester', unknown values go last
+        queue = self._queues.get(guild_id)
+        if not queue:
+            return
+        if key == 'duration':
+            items = sorted(queue, key=lambda item: (item['duration'] is None, item['duration'] or 0))
+        elif key == 'requester':
+            items = sorted(queue, key=lambda item: (item['requester'] is None, (item['requester'] or '').casefold()))
+        else:
+            raise ValueError(f"Unknown sort key: {key}")
+        self._reorder(guild_id, items)
+
+    def move_range(self, guild_id: int, start: int, count: int, new_index: int) -> bool:
+        # Moves queue[start:start + count] (0-based) so that it begins at
+        # new_index of the resulting queue
+        queue = self._queues.get(guild_id)
+        if not queue or count < 1 or not 0 <= start < len(queue):
+            return False
+        items = list(queue)
+        moved = items[start:start + count]
+        rest = items[:start] + items[start + count:]
+        new_index = max(0, min(new_index, len(rest)))
+        self._reorder(guild_id, rest[:new_index] + moved + rest[new_index:])
+        return True
+
+    def _reorder(self, guild_id: int, items):
+        # Whole-queue reorders are persisted as one executemany in one transaction
+        self._queues[guild_id] = deque(items)
+        self._respace(guild_id)
+
+    def move(self, guild_id: int, song_id: int, new_index: int) -> bool:
+        # new_index is 0-based and clamped to the queue bounds
+        queue = self._queues.get(guild_id)
+        if not queue:
+            return False
+        item = next((entry for entry in queue if entry['id'] == song_id), None)
+        if item is None:
+            return False
+        queue.remove(item)
+        new_index = max(0, min(new_index, len(queue)))
+        queue.insert(new_index, item)
+
+        # Only the moved item gets a new position: the midpoint of its new
+        # neighbours. The queue is re-spaced only once the gap runs out.
+        lower = queue[new_index - 1]['position'] if new_index > 0 else None
+        upper = queue[new_index + 1]['position'] if new_index + 1 < len(queue) else None
+        if lower is None and upper is None:
+            position = POSITION_STEP
+        elif lower is None:
+            position = upper - POSITION_STEP
+        elif upper is None:
+            position = lower + POSITION_STEP
+        elif upper - lower >= 2:
+            position = (lower + upper) // 2
+        else:
+            self._respace(guild_id)
+            return True
+        item['position'] = position
+        self._log('reposition', [(position, song_id)])
+        return True
+
+    def _respace(self, guild_id: int):
+        queue = self._queues[guild_id]
+        for index, item in enumerate(queue, 1):
+            item['position'] = index * POSITION_STEP
+        self._log('reposition', [(item['position'], item['id']) for item in queue])
@@ -0,0 +1,122 @@
+import asyncio
+import contextlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from utils.tracing import bind, span
+
+
+class BlockingScheduler:
+    """Runs blocking calls on a dedicated, bounded thread pool.
+
+    Each guild may only occupy ``per_guild_limit`` workers at once, so one
+    busy server queues behind itself instead of starving everyone else.
+    Calls submitted with the same ``key`` while one is already in flight
+    share its result instead of running again. ``priority`` calls (e.g.
+    resolving the track about to play) skip the guild's slot queue, so bulk
+    work such as a playlist import cannot hold them up; they still wait for
+    a free worker.
+    """
+
+    def __init__(self, name: str, max_workers: int, per_guild_limit: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.per_guild_limit = per_guild_limit
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        # guild_id -> [semaphore, number of calls holding or waiting for it]
+        self._guild_slots: Dict[Any, list] = {}
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # waiting: blocked on a guild slot; queued: handed to the pool but not
+        # started; running: executing on a worker thread
+        self.waiting = 0
+        self.queued = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.deduplicated = 0
+        self._counter_lock = threading.Lock()
+
+    async def run(self, guild_id, fn: Callable, *args, key: Optional[Hashable] = None, priority: bool = False):
+        if key is not None:
+            task = self._inflight.get(key)
+            if task is not None:
+                self.deduplicated += 1
+            else:
+                task = asyncio.ensure_future(self._run(guild_id, fn, args, priority))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            # A cancelled caller must not cancel the call others are sharing
+            return await asyncio.shield(task)
+        return await self._run(guild_id, fn, args, priority)
+
+    async def _run(self, guild_id, fn: Callable, args: tuple, priority: bool = False):
+        slot = self._guild_slots.get(guild_id)
+        if slot is None:
+            slot = self._guild_slots[guild_id] = [asyncio.Semaphore(self.per_guild_limit), 0]
+        slot[1] += 1
+        self.waiting += 1
+        submitted = time.perf_counter()
+        acquired = False
+        try:
+            async with contextlib.nullcontext() if priority else slot[0]:
+                acquired = True
+                self.waiting -= 1
+                with self._counter_lock:
+                    self.queued += 1
+                started = [False]
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, bind(self._call), fn, args, started, submitted
+                    )
+                except BaseException:
+                    self.failed += 1
+                    with self._counter_lock:
+                        # Cancelled before a worker picked it up
+                        if not started[0]:
+                            started[0] = True
+                            self.queued -= 1
+                    raise
+                self.completed += 1
+                return result
+        finally:
+            if not acquired:
+                self.waiting -= 1
+            slot[1] -= 1
+            if slot[1] == 0:
+                # Forget idle guilds so the table does not grow with the fleet
+                del self._guild_slots[guild_id]
+
+    def _call(self, fn: Callable, args: tuple, started: list, submitted: float):
+        with self._counter_lock:
+            started[0] = True
+            self.queued -= 1
+            self.running += 1
+        try:
+            # Waiting covers both the guild slot and the pool's queue
+            wait_ms = round((time.perf_counter() - submitted) * 1000, 1)
+            with span(f"{self.name}.{getattr(fn, '__name__', 'call')}", wait_ms=wait_ms):
+                return fn(*args)
+        finally:
+            with self._counter_lock:
+                self.running -= 1
+
+    def guild_depth(self, guild_id) -> int:
+        slot = self._guild_slots.get(guild_id)
+        return slot[1] if slot else 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'workers': self.max_workers,
+            'waiting': self.waiting,
+            'queued': self.queued,
+            'running': self.running,
+            'completed': self.completed,
+            'failed': self.failed,
+            'deduplicated': self.deduplicated,
+            'active_guilds': len(self._guild_slots),
+        }
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
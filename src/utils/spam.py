@@ -0,0 +1,114 @@
+import re
+from collections import Counter, OrderedDict, deque
+from typing import Deque, Hashable, Optional
+
+from utils.profanity import normalize
+
+_NON_WORD = re.compile(r'[\W_]+')
+# "heyyyyy" and "heyy" are the same message for spam purposes
+_REPEATS = re.compile(r'(.)\1+')
+# Shorter messages ("lol", "gg") are repeated innocently all the time
+MIN_FINGERPRINT_LENGTH = 8
+
+
+class SlidingWindowCounter:
+    """Counts events per key over the last ``window`` seconds.
+
+    Each key keeps the timestamps of its recent events; old ones are
+    dropped as new ones arrive. At most ``max_keys`` keys are tracked, the
+    least recently used are forgotten first.
+    """
+
+    def __init__(self, limit: int, window: float, max_keys: int = 10000):
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self._events: "OrderedDict[Hashable, Deque[float]]" = OrderedDict()
+
+    def _trim(self, key: Hashable, now: float) -> Deque[float]:
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque()
+            if len(self._events) > self.max_keys:
+                self._events.popitem(last=False)
+        else:
+            self._events.move_to_end(key)
+        cutoff = now - self.window
+        while events and events[0] <= cutoff:
+            events.popleft()
+        return events
+
+    def hit(self, key: Hashable, now: float) -> int:
+        # Records an event and returns how many fell inside the window
+        events = self._trim(key, now)
+        events.append(now)
+        return len(events)
+
+    def allow(self, key: Hashable, now: float) -> bool:
+        # Records the event only if it stays within the limit
+        events = self._trim(key, now)
+        if len(events) >= self.limit:
+            return False
+        events.append(now)
+        return True
+
+
+def fingerprint(text: str) -> Optional[int]:
+    # Hash of the message with case, lookalike letters, punctuation and
+    # stretched letters folded away; None for messages too short to judge
+    text = _REPEATS.sub(r'\1', _NON_WORD.sub('', normalize(text)))
+    return hash(text) if len(text) >= MIN_FINGERPRINT_LENGTH else None
+
+
+class DuplicateDetector:
+    """Spots a member copy-pasting the same message.
+
+    Per key (the caller uses channel and author, so several members saying
+    "happy birthday" is not spam), a ring buffer holds the fingerprints of
+    the last ``history`` messages sent within ``window`` seconds, next to a
+    running count of each, so a check is O(1) whatever the buffer size.
+    Keys are tracked LRU, up to ``max_keys``.
+
+    Only repeats close together count; a regular saying the same thing on
+    different days is not spam:
+
+    >>> detector = DuplicateDetector(window=60, threshold=3)
+    >>> [detector.is_duplicate('key', 'good morning everyone', now) for now in (0, 10, 20)]
+    [False, False, True]
+    >>> [detector.is_duplicate('key', 'thanks for the help', now) for now in (0, 86400, 172800)]
+    [False, False, False]
+    """
+
+    def __init__(self, window: float = 60.0, threshold: int = 3, history: int = 50, max_keys: int = 10000):
+        self.window = window
+        self.threshold = threshold
+        self.history = history
+        self.max_keys = max_keys
+        self._histories: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def hit(self, key: Hashable, text: str, now: float) -> int:
+        # Records the message and returns how often it occurs in the window
+        # (0 for messages too short to fingerprint)
+        digest = fingerprint(text)
+        if digest is None:
+            return 0
+        entry = self._histories.get(key)
+        if entry is None:
+            entry = self._histories[key] = (deque(), Counter())
+            if len(self._histories) > self.max_keys:
+                self._histories.popitem(last=False)
+        else:
+            self._histories.move_to_end(key)
+        ring, counts = entry
+        cutoff = now - self.window
+        while ring and (ring[0][0] <= cutoff or len(ring) >= self.history):
+            _, oldest = ring.popleft()
+            counts[oldest] -= 1
+            if not counts[oldest]:
+                del counts[oldest]
+        ring.append((now, digest))
+        counts[digest] += 1
+        return counts[digest]
+
+    def is_duplicate(self, key: Hashable, text: str, now: float) -> bool:
+        return self.hit(key, text, now) >= self.threshold
@@ -0,0 +1,71 @@
+import asyncio
+import threading
+from typing import Dict, Optional
+
+
+class StateFeed:
+    """Per-guild change counters that web threads and coroutines can wait on.
+
+    The bot bumps a guild's version whenever something the dashboard shows
+    changes; event streams wait for the version to move instead of polling.
+    Waiters only learn *that* something changed, so any number of changes
+    between two wake-ups collapse into a single update.
+    """
+
+    def __init__(self):
+        self._versions: Dict[int, int] = {}
+        # Bumped on every change, for views that span all guilds
+        self._any = 0
+        self._changed = threading.Condition()
+        # (loop, event) pairs of coroutines blocked in wait_async
+        self._async_waiters = set()
+
+    def publish(self, guild_id: int):
+        # Safe to call from any thread
+        with self._changed:
+            self._versions[guild_id] = self._versions.get(guild_id, 0) + 1
+            self._any += 1
+            self._changed.notify_all()
+            waiters = list(self._async_waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    def _version(self, guild_id: Optional[int]) -> int:
+        return self._any if guild_id is None else self._versions.get(guild_id, 0)
+
+    def version(self, guild_id: Optional[int] = None) -> int:
+        with self._changed:
+            return self._version(guild_id)
+
+    def wait(self, guild_id: Optional[int], since: int, timeout: float) -> int:
+        # Blocks until the version differs from ``since`` or the timeout
+        # passes, and returns the current version either way
+        with self._changed:
+            self._changed.wait_for(lambda: self._version(guild_id) != since, timeout)
+            return self._version(guild_id)
+
+    async def wait_async(self, guild_id: Optional[int], since: int, timeout: float) -> int:
+        # wait() for coroutines: parks on an asyncio.Event instead of a thread
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._changed:
+            if self._version(guild_id) != since:
+                return self._version(guild_id)
+            self._async_waiters.add(waiter)
+        deadline = waiter[0].time() + timeout
+        try:
+            while True:
+                remaining = deadline - waiter[0].time()
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                waiter[1].clear()
+                with self._changed:
+                    if self._version(guild_id) != since:
+                        break
+        finally:
+            with self._changed:
+                self._async_waiters.discard(waiter)
+        return self.version(guild_id)
@@ -0,0 +1,126 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+# How long strikes are collected before being written out as one batch.
+# This is also the worst-case window of strikes lost on a hard crash.
+FLUSH_INTERVAL = 2.0
+# Members whose count is kept in memory; idle ones are dropped (LRU) once
+# their strikes are on disk and reloaded on their next offence
+CACHE_SIZE = 10000
+
+Key = Tuple[int, int]
+
+
+class StrikeCounter:
+    """Per-(guild, member) warning counts, persisted to SQLite via write-behind.
+
+    The first strike of a member not in memory goes through one atomic UPSERT
+    that also returns the stored total. From then on strikes are counted in
+    memory and only the increments are written, batched into one transaction
+    per flush, so a burst of offending messages costs no database round-trips
+    and every message in it still gets its own, correct count.
+    """
+
+    def __init__(self, db, flush_interval: float = FLUSH_INTERVAL, cache_size: int = CACHE_SIZE):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self._counts: "OrderedDict[Key, int]" = OrderedDict()
+        # Increments not yet on disk, and those in the batch being written
+        self._pending: Dict[Key, int] = {}
+        self._flushing: Dict[Key, int] = {}
+        # UPSERTs in flight per key; while any are, more strikes for that
+        # key take the same path so they are ordered by the writer thread
+        self._loading: Dict[Key, int] = {}
+        self._dirty: Optional[asyncio.Event] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._flush_task is None:
+            self._dirty = asyncio.Event()
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._dirty.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self._pending:
+            return
+        self._flushing, self._pending = self._pending, {}
+        try:
+            await self.db.add_warnings([
+                (user_id, guild_id, added) for (guild_id, user_id), added in self._flushing.items()
+            ])
+        except Exception as e:
+            print(f"Failed to persist strikes, will retry: {e}")
+            for key, added in self._flushing.items():
+                self._pending[key] = self._pending.get(key, 0) + added
+            if self._dirty:
+                self._dirty.set()
+        finally:
+            self._flushing = {}
+            self._evict()
+
+    def _evict(self):
+        # Only counts fully on disk can be dropped, or a reload would miss them
+        excess = len(self._counts) - self.cache_size
+        if excess <= 0:
+            return
+        for key in list(self._counts):
+            if excess <= 0:
+                break
+            if key not in self._pending and key not in self._flushing and key not in self._loading:
+                del self._counts[key]
+                excess -= 1
+
+    async def increment(self, guild_id: int, user_id: int) -> int:
+        # Returns the member's warning count including this strike
+        key = (guild_id, user_id)
+        if key in self._counts and key not in self._loading:
+            count = self._counts[key] + 1
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            self._pending[key] = self._pending.get(key, 0) + 1
+            if self._dirty:
+                self._dirty.set()
+            return count
+
+        self._loading[key] = self._loading.get(key, 0) + 1
+        try:
+            count = await self.db.increase_and_get_warnings(user_id, guild_id)
+        finally:
+            self._loading[key] -= 1
+            if not self._loading[key]:
+                del self._loading[key]
+        # The single writer thread runs these in submission order, so the
+        # last one to return holds the newest total
+        if key not in self._loading:
+            self._counts[key] = count
+            self._counts.move_to_end(key)
+            self._evict()
+        return count
+
+    def get(self, guild_id: int, user_id: int) -> Optional[int]:
+        # The in-memory count, or None if the member is not cached
+        return self._counts.get((guild_id, user_id))
+
+    def stats(self) -> Dict:
+        return {
+            'cached_members': len(self._counts),
+            'pending_strikes': sum(self._pending.values()),
+        }
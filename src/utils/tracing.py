@@ -0,0 +1,140 @@
+import contextvars
+import functools
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# Traces slower than this are printed with their breakdown
+DEFAULT_SLOW_THRESHOLD = 0.5
+# Finished traces kept for the dashboard's debug page
+RECENT_TRACES = 50
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('mozart_span', default=None)
+_enabled = False
+_slow_threshold = DEFAULT_SLOW_THRESHOLD
+_recent: deque = deque(maxlen=RECENT_TRACES)
+_slow: deque = deque(maxlen=RECENT_TRACES)
+
+
+def configure(enabled: bool, slow_threshold: float = DEFAULT_SLOW_THRESHOLD):
+    global _enabled, _slow_threshold
+    _enabled = enabled
+    _slow_threshold = slow_threshold
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+class Span:
+    """One timed operation inside a trace.
+
+    The active span lives in a context variable, so it follows the code
+    across awaits and tasks, and across executor hops wrapped with bind().
+    Spans opened while another is active become its children.
+    """
+
+    __slots__ = ('name', 'attrs', 'root', 'parent', 'children', 'start', 'duration', '_token')
+
+    def __init__(self, name: str, attrs: Dict, root: bool = False):
+        self.name = name
+        self.attrs = attrs
+        self.root = root
+        self.parent: Optional[Span] = None
+        self.children: List[Span] = []
+        self.start = 0.0
+        self.duration: Optional[float] = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        if not self.root:
+            self.parent = _current_span.get()
+            if self.parent is not None:
+                self.parent.children.append(self)
+        self._token = _current_span.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.start
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        _current_span.reset(self._token)
+        if self.parent is None:
+            _finish_trace(self)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {
+            'name': self.name,
+            'ms': round(self.duration * 1000, 2) if self.duration is not None else None,
+            # Relative to the parent's start
+            'offset_ms': round((self.start - self.parent.start) * 1000, 2) if self.parent else 0.0,
+            'attrs': dict(self.attrs),
+            'children': [child.to_dict() for child in list(self.children)],
+        }
+
+    def format(self, depth: int = 0) -> str:
+        ms = f"{self.duration * 1000:8.1f} ms" if self.duration is not None else " (running)"
+        attrs = ' '.join(f"{key}={value}" for key, value in self.attrs.items())
+        lines = [f"{'  ' * depth}{ms}  {self.name} {attrs}".rstrip()]
+        for child in list(self.children):
+            lines.append(child.format(depth + 1))
+        return '\n'.join(lines)
+
+
+class _NoopSpan:
+    # Returned when tracing is off (or there is no trace to join), so
+    # instrumented code pays one function call and nothing else
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def trace(name: str, root: bool = False, **attrs):
+    # Starts a trace, or a child span when one is already active. root=True
+    # always starts a new trace (e.g. in a long-lived task that inherited
+    # the context of whatever created it).
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs, root)
+
+
+def span(name: str, **attrs):
+    # A child span of the active trace; nothing outside of one, so hot
+    # paths (e.g. every database call) are only recorded when traced
+    if not _enabled or _current_span.get() is None:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def bind(fn):
+    # Carries the active trace into run_in_executor, which (unlike tasks
+    # and asyncio.to_thread) does not copy the context by itself
+    if not _enabled or _current_span.get() is None:
+        return fn
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def _finish_trace(root: Span):
+    _recent.append(root)
+    if root.duration >= _slow_threshold:
+        _slow.append(root)
+        print(f"Slow operation ({root.duration * 1000:.0f} ms >= {_slow_threshold * 1000:.0f} ms):\n{root.format()}")
+
+
+def recent_traces(slow_only: bool = False) -> List[Dict]:
+    # Newest first
+    return [root.to_dict() for root in reversed(list(_slow if slow_only else _recent))]
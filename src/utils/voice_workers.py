@@ -0,0 +1,342 @@
+import itertools
+import multiprocessing
+import signal
+import struct
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+import discord
+
+# Opus packets a worker may send ahead of playback (50 per second of audio).
+# Workers stop reading FFmpeg when the buffer is full, so a paused or slow
+# voice connection pushes back all the way to the decoder.
+BUFFER_PACKETS = 100
+# Packets played between credit grants; batching keeps IPC traffic low
+CREDIT_BATCH = 10
+# A session with no packet for this long (e.g. a hung worker) is ended
+STALL_TIMEOUT = 20
+# Tried in order when libopus is not found automatically (Alpine paths)
+OPUS_LIBRARIES = ['/usr/lib/libopus.so.0', 'libopus.so.0', 'libopus.so']
+
+# Worker -> bot frames: kind byte, session id, payload
+_FRAME_HEADER = struct.Struct('!cI')
+_PACKET = b'P'
+_END = b'E'
+
+
+def build_source(spec: Dict) -> discord.AudioSource:
+    # Turns the description made by Music.create_source into an audio source;
+    # runs in the bot process, or in a worker when voice workers are enabled
+    if spec['kind'] == 'opus':
+        return discord.FFmpegOpusAudio(
+            spec['url'], codec=spec.get('codec'), before_options=spec['before_options'], options=spec['options']
+        )
+    source = discord.FFmpegPCMAudio(spec['url'], before_options=spec['before_options'], options=spec['options'])
+    # Wrap in Volume Transformer, which scales every frame in Python
+    return discord.PCMVolumeTransformer(source, volume=spec['volume'])
+
+
+def _load_opus():
+    if discord.opus.is_loaded():
+        return
+    try:
+        discord.opus._load_default()
+    except Exception:
+        pass
+    for path in OPUS_LIBRARIES:
+        if discord.opus.is_loaded():
+            return
+        try:
+            discord.opus.load_opus(path)
+        except Exception:
+            pass
+
+
+class _WorkerSession:
+    # One track playing in a worker process: reads the FFmpeg source,
+    # encodes to Opus if needed, and sends packets while it has credit
+    def __init__(self, session_id: int, spec: Dict, send):
+        self.session_id = session_id
+        self.spec = spec
+        self._send = send
+        self._credits = BUFFER_PACKETS
+        self._changed = threading.Condition()
+        self._stopped = False
+        self._source: Optional[discord.AudioSource] = None
+        self._thread = threading.Thread(target=self._run, name=f"voice-session-{session_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def grant(self, credits: int):
+        with self._changed:
+            self._credits += credits
+            self._changed.notify()
+
+    def set_volume(self, volume: float):
+        if isinstance(self._source, discord.PCMVolumeTransformer):
+            self._source.volume = volume
+
+    def stop(self):
+        with self._changed:
+            self._stopped = True
+            self._changed.notify()
+
+    def _run(self):
+        error = ''
+        try:
+            self._source = build_source(self.spec)
+            encoder = None
+            if not self._source.is_opus():
+                _load_opus()
+                encoder = discord.opus.Encoder()
+            while True:
+                with self._changed:
+                    self._changed.wait_for(lambda: self._credits > 0 or self._stopped)
+                    if self._stopped:
+                        break
+                    self._credits -= 1
+                data = self._source.read()
+                if not data:
+                    break
+                if encoder:
+                    data = encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+                self._send(_FRAME_HEADER.pack(_PACKET, self.session_id) + data)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        finally:
+            if self._source:
+                self._source.cleanup()
+        if not self._stopped:
+            try:
+                self._send(_FRAME_HEADER.pack(_END, self.session_id) + error.encode('utf-8'))
+            except OSError:
+                pass
+
+
+def _worker_main(conn):
+    # Entry point of a worker process. Ctrl+C is handled by the bot, which
+    # then closes the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    sessions: Dict[int, _WorkerSession] = {}
+    send_lock = threading.Lock()
+
+    def send(frame: bytes):
+        with send_lock:
+            conn.send_bytes(frame)
+
+    while True:
+        try:
+            op, session_id, arg = conn.recv()
+        except (EOFError, OSError):
+            break
+        if op == 'close':
+            break
+        if op == 'start':
+            session = sessions[session_id] = _WorkerSession(session_id, arg, send)
+            session.start()
+            continue
+        session = sessions.get(session_id)
+        if session is None:
+            continue
+        if op == 'credit':
+            session.grant(arg)
+        elif op == 'volume':
+            session.set_volume(arg)
+        elif op == 'stop':
+            sessions.pop(session_id).stop()
+
+    for session in sessions.values():
+        session.stop()
+
+
+class WorkerAudioSource(discord.AudioSource):
+    """Opus packets produced by a voice worker process.
+
+    The voice client sends them as they are, so the bot process only
+    encrypts and transmits; FFmpeg piping, volume scaling and Opus encoding
+    all happen in the worker. ``volume`` is forwarded to the worker.
+    """
+
+    def __init__(self, worker: "_Worker", session_id: int, volume: float):
+        self.worker = worker
+        self.session_id = session_id
+        self._volume = volume
+        self._packets = deque()
+        self._changed = threading.Condition()
+        self._ended = False
+        self._error = ''
+        self._played = 0
+
+    def is_opus(self) -> bool:
+        return True
+
+    @property
+    def volume(self) -> float:
+        return self._volume
+
+    @volume.setter
+    def volume(self, value: float):
+        self._volume = value
+        self.worker.send(('volume', self.session_id, value))
+
+    def feed(self, packet: bytes):
+        with self._changed:
+            self._packets.append(packet)
+            self._changed.notify()
+
+    def end(self, error: str = ''):
+        with self._changed:
+            self._ended = True
+            self._error = error
+            self._changed.notify()
+
+    def read(self) -> bytes:
+        # Called every 20 ms by the voice client's player thread
+        with self._changed:
+            if not self._changed.wait_for(lambda: self._packets or self._ended, STALL_TIMEOUT):
+                raise RuntimeError(f"voice worker sent nothing for {STALL_TIMEOUT}s")
+            if not self._packets:
+                if self._error:
+                    raise RuntimeError(self._error)
+                return b''
+            packet = self._packets.popleft()
+        self._played += 1
+        if self._played % CREDIT_BATCH == 0:
+            self.worker.send(('credit', self.session_id, CREDIT_BATCH))
+        return packet
+
+    def cleanup(self):
+        self.worker.close_session(self)
+
+
+class _Worker:
+    # Bot-side handle of one worker process: its pipe, its sessions, and a
+    # thread routing the frames it sends to their sources
+    def __init__(self, index: int, context):
+        self.index = index
+        self._context = context
+        self.sessions: Dict[int, WorkerAudioSource] = {}
+        self._send_lock = threading.Lock()
+        self.closing = False
+        self.restarts = 0
+        self.packets = 0
+        self._spawn()
+
+    def _spawn(self):
+        self.conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_worker_main, args=(child_conn,), name=f"voice-worker-{self.index}", daemon=True
+        )
+        self.process.start()
+        # Only the child keeps its end, so EOF is seen when it exits
+        child_conn.close()
+        self._reader = threading.Thread(target=self._read_frames, name=f"voice-worker-{self.index}-reader", daemon=True)
+        self._reader.start()
+
+    def send(self, message: tuple) -> bool:
+        try:
+            with self._send_lock:
+                self.conn.send(message)
+            return True
+        except (OSError, ValueError):
+            # Worker gone; the reader thread ends its sessions
+            return False
+
+    def open_session(self, session_id: int, spec: Dict) -> WorkerAudioSource:
+        source = WorkerAudioSource(self, session_id, spec.get('volume', 1.0))
+        self.sessions[session_id] = source
+        if not self.send(('start', session_id, spec)):
+            # Died (and is being restarted) just now
+            self.sessions.pop(session_id, None)
+            source.end("voice worker unavailable")
+        return source
+
+    def close_session(self, source: WorkerAudioSource):
+        if self.sessions.pop(source.session_id, None) is not None:
+            self.send(('stop', source.session_id, None))
+
+    def _read_frames(self):
+        while True:
+            try:
+                frame = self.conn.recv_bytes()
+            except (EOFError, OSError):
+                break
+            kind, session_id = _FRAME_HEADER.unpack_from(frame)
+            source = self.sessions.get(session_id)
+            if source is None:
+                # Already stopped on this side
+                continue
+            if kind == _PACKET:
+                self.packets += 1
+                source.feed(frame[_FRAME_HEADER.size:])
+            else:
+                source.end(frame[_FRAME_HEADER.size:].decode('utf-8'))
+
+        self.conn.close()
+        for source in list(self.sessions.values()):
+            source.end("voice worker exited")
+        self.sessions.clear()
+        self.process.join(timeout=1)
+        if not self.closing:
+            print(f"Voice worker {self.index} exited (code {self.process.exitcode}), restarting")
+            self.restarts += 1
+            self._spawn()
+
+    @property
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def close(self):
+        self.closing = True
+        self.send(('close', 0, None))
+        self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class VoiceWorkerPool:
+    """Runs audio playback in a pool of worker processes.
+
+    Each track is a session in one worker (the one with the fewest active
+    sessions): the worker runs FFmpeg, scales volume and encodes Opus, and
+    streams the packets back over a pipe to a WorkerAudioSource playing in
+    the guild's voice client. Audio work thus runs under each worker's own
+    GIL, while the bot process keeps the gateway, commands and dashboard.
+    A crashed worker ends its sessions (the players move on) and is
+    restarted.
+    """
+
+    def __init__(self, processes: int):
+        self.processes = processes
+        # Spawned, not forked: the bot process runs several threads
+        self._context = multiprocessing.get_context('spawn')
+        self._workers: List[_Worker] = []
+        self._session_ids = itertools.count(1)
+
+    def start(self):
+        # Blocking (spawns interpreters); call it from an executor
+        while len(self._workers) < self.processes:
+            self._workers.append(_Worker(len(self._workers), self._context))
+
+    def open_source(self, spec: Dict) -> WorkerAudioSource:
+        worker = min(self._workers, key=lambda worker: len(worker.sessions))
+        return worker.open_session(next(self._session_ids), spec)
+
+    def stats(self) -> Dict:
+        return {
+            'processes': self.processes,
+            'workers': [{
+                'pid': worker.process.pid,
+                'alive': worker.alive,
+                'sessions': len(worker.sessions),
+                'packets': worker.packets,
+                'restarts': worker.restarts,
+            } for worker in self._workers],
+        }
+
+    def close(self):
+        for worker in self._workers:
+            worker.close()
+        self._workers.clear()
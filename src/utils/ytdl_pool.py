@@ -0,0 +1,117 @@
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict
+
+import yt_dlp
+
+# Instances kept per profile; a checkout beyond this waits for a free one
+DEFAULT_MAX_PER_PROFILE = 4
+# Instances built up front per profile when the pool is warmed
+DEFAULT_WARM_PER_PROFILE = 1
+
+_COMMON: Dict[str, Any] = {
+    'quiet': True,
+    'no_warnings': True,
+    'nocheckcertificate': True,
+}
+
+# One option set per kind of request. YoutubeDL options are fixed at
+# construction, so every distinct set needs its own instances.
+PROFILES: Dict[str, Dict[str, Any]] = {
+    # /play search, YouTube first
+    'search': {
+        **_COMMON,
+        'format': 'bestaudio/best',
+        'noplaylist': True,
+        'default_search': 'ytsearch',
+        'extractor_args': {'youtube': {'player_client': ['android', 'ios', 'web']}},
+    },
+    # /play fallback: force progressive HTTP MP3 to avoid HLS issues entirely
+    'search_soundcloud': {
+        **_COMMON,
+        'format': 'bestaudio[protocol=http]',
+        'noplaylist': True,
+        'default_search': 'scsearch',
+        'extractor_args': {'youtube': {'player_client': ['android', 'ios', 'web']}},
+    },
+    # Stream URL for a known page
+    'stream': {
+        **_COMMON,
+        'format': 'bestaudio/best',
+        'noplaylist': True,
+        'extractor_args': {'youtube': {'player_client': ['android', 'web', 'ios']}},
+    },
+    'stream_soundcloud': {
+        **_COMMON,
+        'format': 'bestaudio[protocol=http]',
+        'noplaylist': True,
+        'extractor_args': {'youtube': {'player_client': ['android', 'web', 'ios']}},
+    },
+    # Metadata of a single playlist entry
+    'entry': {
+        **_COMMON,
+        'noplaylist': True,
+        'extractor_args': {'youtube': {'player_client': ['android', 'ios', 'web']}},
+    },
+}
+
+
+class YoutubeDLPool:
+    """Reusable, pre-warmed ``yt_dlp.YoutubeDL`` instances per option profile.
+
+    Building a YoutubeDL loads every extractor and sets up a cookie jar and
+    HTTP session; reusing instances keeps those (and their keep-alive
+    connections) around. An instance is not thread-safe, so each one is
+    checked out by a single worker thread at a time.
+    """
+
+    def __init__(self, profiles=None, max_per_profile: int = DEFAULT_MAX_PER_PROFILE):
+        self.profiles = profiles or PROFILES
+        self.max_per_profile = max_per_profile
+        self._idle = {name: queue.LifoQueue() for name in self.profiles}
+        self._created = {name: 0 for name in self.profiles}
+        self._lock = threading.Lock()
+
+    def _create(self, profile: str):
+        # Returns a new instance, or None if the profile is at capacity
+        with self._lock:
+            if self._created[profile] >= self.max_per_profile:
+                return None
+            self._created[profile] += 1
+        try:
+            return yt_dlp.YoutubeDL(dict(self.profiles[profile]))
+        except Exception:
+            with self._lock:
+                self._created[profile] -= 1
+            raise
+
+    def warm(self, per_profile: int = DEFAULT_WARM_PER_PROFILE):
+        # Blocking; run it off the event loop
+        for profile in self.profiles:
+            while self._created[profile] < min(per_profile, self.max_per_profile):
+                ydl = self._create(profile)
+                if ydl is None:
+                    break
+                self._idle[profile].put(ydl)
+
+    @contextmanager
+    def checkout(self, profile: str):
+        idle = self._idle[profile]
+        try:
+            # LIFO, so the most recently used (warmest) instance goes out first
+            ydl = idle.get_nowait()
+        except queue.Empty:
+            ydl = self._create(profile) or idle.get()
+        try:
+            yield ydl
+        finally:
+            idle.put(ydl)
+
+    def close(self):
+        for idle in self._idle.values():
+            while True:
+                try:
+                    idle.get_nowait().close()
+                except queue.Empty:
+                    break
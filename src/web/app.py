@@ -1,9 +1,16 @@
-from flask import Flask, render_template, redirect, url_for, flash, session, request, abort
+from flask import Flask, Response, make_response, render_template, redirect, url_for, flash, session, request, abort, stream_with_context, g
 import threading
 import asyncio
+import hashlib
+import math
+import time
+from collections import Counter
 import discord
 import os
-import requests
+from utils.discord_oauth import DiscordOAuthClient, DEFAULT_API_ENDPOINT
+from utils.metrics import REGISTRY
+from utils import tracing
+from utils.profiler import MAX_PROFILE_SECONDS, ProfilerBusy, profile_loop, sample_stacks
 
 app = Flask(__name__)
 
@@ -24,7 +31,11 @@ if not app.secret_key:
 # OAuth2 Configuration
 DISCORD_CLIENT_ID = os.getenv('DISCORD_CLIENT_ID')
 DISCORD_CLIENT_SECRET = os.getenv('DISCORD_CLIENT_SECRET')
-discord_api_endpoint = "https://discord.com/api/v10"
+# Overridable so logins can be exercised against a local stub (benchmarks/oauth_stub.py)
+discord_api_endpoint = os.getenv('DISCORD_API_ENDPOINT', DEFAULT_API_ENDPOINT)
+
+# Discord user ids allowed to use the /debug pages (and every guild's dashboard)
+ADMIN_USER_IDS = {user_id.strip() for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
 
 # Auto-detect or use env var
 def get_redirect_uri():
@@ -33,6 +44,31 @@ def get_redirect_uri():
     # Fallback for local dev
     return 'http://localhost:5000/callback' 
 
+# Waitress worker threads; every open dashboard tab holds one for its event stream
+WEB_THREADS = int(os.getenv('WEB_THREADS', 16))
+# Event streams beyond this get a 503 and the page falls back to polling,
+# so streams can never take every thread
+MAX_EVENT_STREAMS = int(os.getenv('WEB_MAX_EVENT_STREAMS', max(1, WEB_THREADS // 2)))
+event_stream_slots = threading.BoundedSemaphore(MAX_EVENT_STREAMS)
+# Seconds between keep-alive comments on an idle stream (also how quickly a
+# closed tab frees its thread)
+SSE_KEEPALIVE = 15
+# Changes arriving within this window are sent as a single update
+SSE_COALESCE = 0.1
+# Cached dashboard pages are revalidated at least this often, since bot-wide
+# stats such as latency are not part of the guild's versioned state
+STATS_REFRESH = 30
+
+# Seconds a guild membership check is trusted before asking Discord again
+GUILD_ACCESS_TTL = 60
+# Membership checks kept at most; the cache is emptied when it grows past this
+GUILD_ACCESS_CACHE_SIZE = 10000
+# (guild_id, user_id) -> (expires, is_member)
+guild_access_cache = {}
+
+# Shared keep-alive client for the login flow, one pooled connection per worker thread
+oauth_client = DiscordOAuthClient(discord_api_endpoint, pool_size=WEB_THREADS)
+
 # Global variable to hold the running bot instance
 bot = None
 
@@ -41,12 +77,122 @@ def get_music_cog():
         return bot.get_cog('Music')
     return None
 
-def get_active_voice_client():
-    # Improved logic: Return the first active voice client found
-    if bot and bot.voice_clients:
-        return bot.voice_clients[0] 
+def get_guild_voice_client(guild_id):
+    if bot:
+        guild = bot.get_guild(guild_id)
+        if guild and isinstance(guild.voice_client, discord.VoiceClient):
+            return guild.voice_client
     return None
 
+def run_on_bot_loop(coro, timeout=2):
+    # Cog state lives on the bot's event loop; read it there rather than
+    # from the web thread
+    future = asyncio.run_coroutine_threadsafe(coro, bot.loop)
+    return future.result(timeout=timeout)
+
+def get_shard_stats():
+    # Per-shard latency and guild counts; empty unless the bot is sharded
+    shards = getattr(bot, 'shards', None)
+    if not shards:
+        return []
+    # Maintained by the bot's guild events (main.py)
+    guild_counts = getattr(bot, 'shard_guild_counts', {})
+    return [{
+        'id': shard_id,
+        # Infinite until the shard's first heartbeat is acknowledged
+        'latency': round(shard.latency * 1000) if math.isfinite(shard.latency) else None,
+        'guilds': guild_counts.get(shard_id, 0),
+        'online': not shard.is_closed(),
+    } for shard_id, shard in sorted(shards.items())]
+
+# Metrics (served on /metrics in the Prometheus text format)
+HTTP_SECONDS = REGISTRY.histogram(
+    'mozart_http_request_seconds', "Dashboard request handling time (event streams: until streaming starts)",
+    ['endpoint', 'method']
+)
+HTTP_RESPONSES = REGISTRY.counter('mozart_http_responses_total', "Dashboard responses by status", ['endpoint', 'status'])
+
+def collect_executor_depths():
+    music_cog = get_music_cog()
+    if not music_cog:
+        return {}
+    extraction = music_cog.extractor.stats()
+    database = music_cog.db.stats()
+    return {
+        ('extraction', 'waiting'): extraction['waiting'],
+        ('extraction', 'queued'): extraction['queued'],
+        ('extraction', 'running'): extraction['running'],
+        ('database', 'pending_reads'): database['pending_reads'],
+        ('database', 'pending_writes'): database['pending_writes'],
+    }
+
+def collect_player_states():
+    music_cog = get_music_cog()
+    if not music_cog:
+        return {}
+    states = Counter(player.state.name.lower() for player in list(music_cog.players.values()))
+    return {(state,): count for state, count in states.items()}
+
+def collect_voice_worker_sessions():
+    music_cog = get_music_cog()
+    if not music_cog or not music_cog.voice_workers:
+        return {}
+    return {(str(index),): worker['sessions'] for index, worker in enumerate(music_cog.voice_workers.stats()['workers'])}
+
+def collect_shards(field):
+    def collect():
+        if not (bot and bot.is_ready()):
+            return {}
+        if field == 'latency':
+            return {(str(shard['id']),): shard['latency'] / 1000 for shard in get_shard_stats() if shard['latency'] is not None}
+        return {(str(shard['id']),): shard['guilds'] for shard in get_shard_stats()}
+    return collect
+
+def collect_pending_strikes():
+    moderation_cog = bot.get_cog('Moderation') if bot else None
+    return {(): moderation_cog.strikes.stats()['pending_strikes']} if moderation_cog else {}
+
+def get_cache_stats():
+    music_cog = get_music_cog()
+    caches = {'oauth_users': oauth_client.stats()}
+    if music_cog:
+        caches['extraction'] = music_cog.extraction_cache.stats()
+        if music_cog.audio_cache:
+            caches['audio'] = music_cog.audio_cache.stats()
+    return caches
+
+def collect_cache_entries():
+    return {(name,): stats['entries'] for name, stats in get_cache_stats().items()}
+
+def collect_cache_lookups():
+    lookups = {}
+    for name, stats in get_cache_stats().items():
+        lookups[(name, 'hit')] = stats['hits']
+        lookups[(name, 'miss')] = stats['misses']
+    return lookups
+
+REGISTRY.gauge('mozart_executor_depth', "Calls waiting or running in the blocking-work pools", ['pool', 'state'], collect_executor_depths)
+REGISTRY.gauge('mozart_players', "Guild players by state", ['state'], collect_player_states)
+REGISTRY.gauge('mozart_voice_worker_sessions', "Tracks playing in each voice worker process", ['worker'], collect_voice_worker_sessions)
+REGISTRY.gauge('mozart_shard_latency_seconds', "Gateway heartbeat latency per shard", ['shard'], collect_shards('latency'))
+REGISTRY.gauge('mozart_shard_guilds', "Servers per shard", ['shard'], collect_shards('guilds'))
+REGISTRY.gauge('mozart_pending_strikes', "Strikes counted but not yet written to the database", [], collect_pending_strikes)
+REGISTRY.gauge('mozart_cache_entries', "Entries held in each cache", ['cache'], collect_cache_entries)
+REGISTRY.gauge('mozart_cache_lookups', "Cache lookups since startup by result", ['cache', 'result'], collect_cache_lookups)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get('request_started')
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        HTTP_SECONDS.observe(time.perf_counter() - started, endpoint, request.method)
+        HTTP_RESPONSES.inc(endpoint, str(response.status_code))
+    return response
+
 # Auth Decorator
 def login_required(f):
     from functools import wraps
@@ -58,33 +204,77 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
-def get_dashboard_context():
-    music_cog = get_music_cog()
-    voice_client = get_active_voice_client()
-    
-    current_song = None
-    queue = []
-    
-    # If we have an active connection, fetch data specific to THAT guild
-    if voice_client and music_cog:
-        guild_id = voice_client.guild.id
-        # Safely access the dictionary using .get()
-        current_song = music_cog.current_songs.get(guild_id)
-        
-        # Queue is now in DB (async), so we must fetch it safely from the bot's loop
+async def resolve_guild_access(guild_id, user_id):
+    # Runs on the bot loop. There is no members intent, so the member cache
+    # is incomplete and a miss is confirmed with Discord.
+    guild = bot.get_guild(guild_id)
+    if guild is None:
+        return False
+    key = (guild_id, user_id)
+    cached = guild_access_cache.get(key)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    is_member = guild.get_member(int(user_id)) is not None
+    if not is_member:
         try:
-            if bot and bot.loop:
-                 future = asyncio.run_coroutine_threadsafe(music_cog.get_queue(guild_id), bot.loop)
-                 queue = future.result(timeout=2) # 2s timeout should be plenty for local DB
-            else:
-                 queue = []
-        except Exception as e:
-            print(f"Failed to fetch queue: {e}")
-            queue = []
-    
-    is_playing = voice_client.is_playing() if voice_client else False
-    is_paused = voice_client.is_paused() if voice_client else False
-    
+            await guild.fetch_member(int(user_id))
+            is_member = True
+        except discord.NotFound:
+            pass
+    if len(guild_access_cache) >= GUILD_ACCESS_CACHE_SIZE:
+        guild_access_cache.clear()
+    guild_access_cache[key] = (time.monotonic() + GUILD_ACCESS_TTL, is_member)
+    return is_member
+
+def can_access_guild(guild_id):
+    user_id = session.get('user_id')
+    if user_id is None:
+        return False
+    if user_id in ADMIN_USER_IDS:
+        return True
+    if not (bot and bot.is_ready()):
+        return False
+    cached = guild_access_cache.get((guild_id, user_id))
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    try:
+        asyncio.get_running_loop()
+        # On the bot loop (async web tier), which warms the cache before
+        # dispatching; waiting here would deadlock it
+        return False
+    except RuntimeError:
+        pass
+    try:
+        return run_on_bot_loop(resolve_guild_access(guild_id, user_id), timeout=5)
+    except Exception as e:
+        print(f"Guild access check failed: {e}")
+        return False
+
+def guild_access_required(f):
+    # Logged in, and a member of the guild in the URL (or an admin)
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'user_id' not in session:
+            flash("Please login to access this feature.", "warning")
+            return redirect(url_for('index'))
+        if not can_access_guild(kwargs['guild_id']):
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+def admin_required(f):
+    from functools import wraps
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('user_id') not in ADMIN_USER_IDS:
+            abort(403)
+        return f(*args, **kwargs)
+    return decorated_function
+
+def get_dashboard_context(guild_id=None, snapshot=None):
+    music_cog = get_music_cog()
+
     # Pass user session info
     user_info = None
     if 'user_id' in session:
@@ -94,51 +284,152 @@ def get_dashboard_context():
             'id': session.get('user_id')
         }
 
-    if bot and bot.is_ready():
-        return {
-            'bot_name': bot.user.name,
-            'latency': round(bot.latency * 1000),
-            'guild_count': len(bot.guilds),
-            'current_song': current_song,
-            'queue': queue,
-            'is_playing': is_playing,
-            'is_paused': is_paused,
-            'voice_connected': bool(voice_client),
-            'user': user_info,
-            # Enhancements
-            'volume': int(music_cog.volumes.get(voice_client.guild.id, 0.5) * 100) if voice_client and music_cog else 50,
-            'loop_state': music_cog.loop_states.get(voice_client.guild.id, False) if voice_client and music_cog else False
-        }
+    context = {
+        'bot_name': "Starting...",
+        'latency': 0,
+        'guild_count': 0,
+        'user': user_info,
+        'guilds': [],
+        'guild': None,
+        'shards': [],
+        # Version of the guild (or overview) state shown; None means uncacheable
+        'state_version': None,
+    }
+    if not (bot and bot.is_ready() and music_cog):
+        return context
+
+    context.update({
+        'bot_name': bot.user.name,
+        'latency': round(bot.latency * 1000),
+        # Summed from the per-shard counts rather than copying bot.guilds
+        'guild_count': sum(bot.shard_guild_counts.values()),
+        'shards': get_shard_stats(),
+    })
+    # Snapshots are immutable and swapped in whole by the bot, so they are
+    # read here without locks or a round-trip to the bot loop
+    if guild_id is None:
+        # Overview: only guilds with a voice connection
+        overview = music_cog.overview
+        context['guilds'] = overview['guilds']
+        context['state_version'] = overview['version']
+        return context
+
+    if snapshot is None:
+        snapshot = music_cog.snapshots.get(guild_id)
+    if snapshot is None:
+        try:
+            # First look at this guild since the bot started
+            snapshot = run_on_bot_loop(music_cog.guild_snapshot(guild_id))
+        except Exception as e:
+            print(f"Failed to fetch guild state: {e}")
+    if snapshot is not None:
+        context['guild'] = snapshot
+        context['state_version'] = snapshot['version']
+    return context
+
+def render_dashboard(template, context, guild_id=None):
+    # Answers 304 Not Modified when the browser already has this version of
+    # the page, without rendering anything
+    if context['state_version'] is None or '_flashes' in session:
+        return render_template(template, **context)
+    user_id = context['user']['id'] if context['user'] else 'anon'
+    # Bot-wide stats (latency, server count) are not versioned, so the tag
+    # also rolls over every STATS_REFRESH seconds
+    etag = f"{template}:{guild_id or 'all'}:{context['state_version']}:{user_id}:{int(time.time() // STATS_REFRESH)}"
+    etag = hashlib.sha1(etag.encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
     else:
-         return {
-            'bot_name': "Starting...",
-            'latency': 0,
-            'guild_count': 0,
-            'current_song': None,
-            'queue': [],
-            'is_playing': False,
-            'is_paused': False,
-            'voice_connected': False,
-            'user': user_info,
-            'volume': 50,
-            'loop_state': False
-        }
+        response = make_response(render_template(template, **context))
+    response.set_etag(etag)
+    # Cache, but always revalidate
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @app.route('/')
 def index():
     context = get_dashboard_context()
-    return render_template('dashboard.html', **context)
+    return render_dashboard('dashboard.html', context)
 
 @app.route('/dashboard/partial')
 def dashboard_partial():
     context = get_dashboard_context()
-    return render_template('partials/dashboard_body.html', **context)
+    return render_dashboard('partials/dashboard_body.html', context)
+
+@app.route('/guild/<int:guild_id>/')
+@guild_access_required
+def guild_dashboard(guild_id):
+    context = get_dashboard_context(guild_id)
+    if bot and bot.is_ready() and context['guild'] is None:
+        abort(404)
+    return render_dashboard('dashboard.html', context, guild_id)
+
+@app.route('/guild/<int:guild_id>/partial')
+@guild_access_required
+def guild_dashboard_partial(guild_id):
+    context = get_dashboard_context(guild_id)
+    return render_dashboard('partials/dashboard_body.html', context, guild_id)
+
+def sse_message(event, data):
+    # Every line of a multi-line payload needs its own data: field
+    return f"event: {event}\n" + "".join(f"data: {line}\n" for line in data.splitlines() or ['']) + "\n"
+
+def event_stream(guild_id=None):
+    # Pushes the re-rendered dashboard body whenever the bot publishes a
+    # change for guild_id (any guild for the overview)
+    music_cog = get_music_cog()
+    if not music_cog:
+        return "Bot not active", 503
+    if not event_stream_slots.acquire(blocking=False):
+        return "Too many event streams", 503
+    feed = music_cog.state_feed
+
+    def generate():
+        try:
+            yield "retry: 3000\n\n"
+            # Start with a full update, covering changes made between the
+            # page load and this connection
+            version = None
+            while True:
+                if version is not None:
+                    new_version = feed.wait(guild_id, version, SSE_KEEPALIVE)
+                    if new_version == version:
+                        yield ": keep-alive\n\n"
+                        continue
+                    time.sleep(SSE_COALESCE)
+                context = get_dashboard_context(guild_id)
+                if guild_id is not None and context['guild'] is None and bot.is_ready():
+                    # The bot left the guild
+                    return
+                # The version actually rendered: if the snapshot is still
+                # being rebuilt, the next wait returns at once and it is sent then
+                version = context['state_version']
+                if version is None:
+                    version = feed.version(guild_id)
+                yield sse_message('update', render_template('partials/dashboard_body.html', **context))
+        finally:
+            event_stream_slots.release()
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        # Keep reverse proxies from buffering the stream
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/events')
+def dashboard_events():
+    return event_stream()
+
+@app.route('/guild/<int:guild_id>/events')
+@guild_access_required
+def guild_dashboard_events(guild_id):
+    return event_stream(guild_id)
 
 # --- Control APIs ---
 
-@app.route('/api/volume', methods=['POST'])
-@login_required
-def set_volume():
+@app.route('/guild/<int:guild_id>/api/volume', methods=['POST'])
+@guild_access_required
+def set_volume(guild_id):
     try:
         data = request.json
         if not data or 'volume' not in data:
@@ -146,61 +437,98 @@ def set_volume():
             
         vol_percent = int(data['volume'])
         music_cog = get_music_cog()
-        vc = get_active_voice_client()
+        vc = get_guild_voice_client(guild_id)
         
         if music_cog and vc:
-            music_cog.set_volume(vc.guild.id, vol_percent / 100.0)
+            music_cog.set_volume(guild_id, vol_percent / 100.0)
             return "Volume set", 200
         return "Bot not active", 400
     except Exception as e:
         print(f"Volume API Error: {e}")
         return str(e), 500
 
-@app.route('/api/loop', methods=['POST'])
-@login_required
-def toggle_loop():
+@app.route('/guild/<int:guild_id>/api/effects', methods=['POST'])
+@guild_access_required
+def set_effects(guild_id):
+    from utils.audio_effects import AudioEffects
+    try:
+        data = request.json
+        if not data:
+            return "Missing effects", 400
+
+        music_cog = get_music_cog()
+        vc = get_guild_voice_client(guild_id)
+
+        if music_cog and vc:
+            current = music_cog.get_effects(guild_id).to_dict()
+            current.update({key: data[key] for key in current if key in data})
+            music_cog.set_effects(guild_id, AudioEffects(
+                gain_db=float(current['gain_db']),
+                normalize=bool(current['normalize']),
+                bass_boost_db=float(current['bass_boost_db']),
+                crossfade=float(current['crossfade'])
+            ))
+            return "Effects set", 200
+        return "Bot not active", 400
+    except Exception as e:
+        print(f"Effects API Error: {e}")
+        return str(e), 500
+
+@app.route('/guild/<int:guild_id>/api/loop', methods=['POST'])
+@guild_access_required
+def toggle_loop(guild_id):
     music_cog = get_music_cog()
-    vc = get_active_voice_client()
+    vc = get_guild_voice_client(guild_id)
     if music_cog and vc:
-        new_state = music_cog.toggle_loop(vc.guild.id)
+        new_state = music_cog.toggle_loop(guild_id)
         return str(new_state).lower(), 200
     return "Bot not active", 400
 
-@app.route('/api/shuffle', methods=['POST'])
-@login_required
-def shuffle_queue():
+@app.route('/guild/<int:guild_id>/api/shuffle', methods=['POST'])
+@guild_access_required
+def shuffle_queue(guild_id):
     music_cog = get_music_cog()
-    vc = get_active_voice_client()
+    vc = get_guild_voice_client(guild_id)
     if music_cog and vc and bot and bot.loop:
-        asyncio.run_coroutine_threadsafe(music_cog.shuffle_queue(vc.guild.id), bot.loop)
+        asyncio.run_coroutine_threadsafe(music_cog.shuffle_queue(guild_id), bot.loop)
         return "Shuffled", 200
     return "Bot or event loop not active", 400
 
-@app.route('/api/clear', methods=['POST'])
-@login_required
-def clear_queue():
+@app.route('/guild/<int:guild_id>/api/clear', methods=['POST'])
+@guild_access_required
+def clear_queue(guild_id):
     music_cog = get_music_cog()
-    vc = get_active_voice_client()
+    vc = get_guild_voice_client(guild_id)
     if music_cog and vc and bot and bot.loop:
-        asyncio.run_coroutine_threadsafe(music_cog.clear_state(vc.guild.id), bot.loop)
+        asyncio.run_coroutine_threadsafe(music_cog.clear_state(guild_id), bot.loop)
         # Note: clear_state also stops the player usually, but let's check config
         # Actually in music.py clear_state clears DB and current_song dict
         return "Cleared", 200
     return "Bot or event loop not active", 400
 
-@app.route('/api/remove/<int:song_id>', methods=['POST'])
-@login_required
-def remove_song(song_id):
+@app.route('/guild/<int:guild_id>/api/remove/<int:song_id>', methods=['POST'])
+@guild_access_required
+def remove_song(guild_id, song_id):
     music_cog = get_music_cog()
-    vc = get_active_voice_client()
+    vc = get_guild_voice_client(guild_id)
     if music_cog and vc and bot and bot.loop:
-        asyncio.run_coroutine_threadsafe(music_cog.remove_song(vc.guild.id, song_id), bot.loop)
+        asyncio.run_coroutine_threadsafe(music_cog.remove_song(guild_id, song_id), bot.loop)
         return "Removed", 200
     return "Bot or event loop not active", 400
 
+def oauth_credentials():
+    # The configured application wins; the login form is only a fallback
+    # for deployments that never set one
+    if DISCORD_CLIENT_ID and DISCORD_CLIENT_SECRET:
+        return DISCORD_CLIENT_ID, DISCORD_CLIENT_SECRET
+    return session.get('discord_client_id'), session.get('discord_client_secret')
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
-    if request.method == 'POST':
+    if DISCORD_CLIENT_ID and DISCORD_CLIENT_SECRET:
+        # Credentials typed into the form are ignored
+        client_id = DISCORD_CLIENT_ID
+    elif request.method == 'POST':
         client_id = request.form.get('client_id')
         client_secret = request.form.get('client_secret')
         
@@ -211,23 +539,21 @@ def login():
         # Store in session for the callback
         session['discord_client_id'] = client_id
         session['discord_client_secret'] = client_secret
-        
-        redirect_uri = get_redirect_uri()
-        scope = "identify"
-        discord_login_url = (
-            f"https://discord.com/api/oauth2/authorize?client_id={client_id}"
-            f"&redirect_uri={redirect_uri}&response_type=code&scope={scope}"
-        )
-        return redirect(discord_login_url)
+    else:
+        # GET request - show form
+        return render_template('login.html')
 
-    # GET request - show form
-    return render_template('login.html')
+    redirect_uri = get_redirect_uri()
+    scope = "identify"
+    discord_login_url = (
+        f"https://discord.com/api/oauth2/authorize?client_id={client_id}"
+        f"&redirect_uri={redirect_uri}&response_type=code&scope={scope}"
+    )
+    return redirect(discord_login_url)
 
 @app.route('/callback')
 def callback():
-    # Retrieve credentials from session
-    client_id = session.get('discord_client_id')
-    client_secret = session.get('discord_client_secret')
+    client_id, client_secret = oauth_credentials()
 
     if not client_id or not client_secret:
         flash("Session expired or missing credentials. Please try again.", "danger")
@@ -237,89 +563,136 @@ def callback():
     if not code:
         return "No code provided", 400
 
-    redirect_uri = get_redirect_uri()
-    
-    data = {
-        'client_id': client_id,
-        'client_secret': client_secret,
-        'grant_type': 'authorization_code',
-        'code': code,
-        'redirect_uri': redirect_uri,
-        'scope': 'identify'
-    }
-    
-    headers = {
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    
     try:
-        r = requests.post(f'{discord_api_endpoint}/oauth2/token', data=data, headers=headers)
-        r.raise_for_status()
-        tokens = r.json()
-        access_token = tokens['access_token']
-        
+        tokens = oauth_client.exchange_code(client_id, client_secret, code, get_redirect_uri())
         # Get User Info
-        headers = {
-            'Authorization': f"Bearer {access_token}"
-        }
-        r_user = requests.get(f'{discord_api_endpoint}/users/@me', headers=headers)
-        r_user.raise_for_status()
-        user_data = r_user.json()
-        
-        # Save to session (keep the credentials for potential token refresh if we implemented that, 
-        # but for now just the user info is enough for the dashboard)
-        session['user_id'] = user_data['id']
-        session['username'] = user_data['username']
-        session['avatar'] = user_data['avatar']
-        
-        # Clear secrets from session if we want to be extra paranoid, 
-        # but keep them if we needed to refresh tokens. 
-        # For this simple implementation, we can clean them up or leave them.
-        # Leaving them allows re-auth without re-typing if the token expires quickly 
-        # (though we aren't handling refresh logic here).
-        
-        flash(f"Welcome, {user_data['username']}!", 'success')
-        return redirect(url_for('index'))
+        return finish_login(oauth_client.get_user(tokens['access_token']))
         
     except Exception as e:
         print(f"OAuth Error: {e}")
         return f"Authentication failed: {e}", 500
 
+def finish_login(user_data):
+    # Save to session (keep the credentials for potential token refresh if we implemented that, 
+    # but for now just the user info is enough for the dashboard)
+    session['user_id'] = user_data['id']
+    session['username'] = user_data['username']
+    session['avatar'] = user_data['avatar']
+    
+    # Clear secrets from session if we want to be extra paranoid, 
+    # but keep them if we needed to refresh tokens. 
+    # For this simple implementation, we can clean them up or leave them.
+    # Leaving them allows re-auth without re-typing if the token expires quickly 
+    # (though we aren't handling refresh logic here).
+    
+    flash(f"Welcome, {user_data['username']}!", 'success')
+    return redirect(url_for('index'))
+
 @app.route('/logout')
 def logout():
     session.clear()
     flash("Logged out successfully.", 'info')
     return redirect(url_for('index'))
 
-@app.route('/pause', methods=['POST'])
-@login_required
-def pause():
-    vc = get_active_voice_client()
+@app.route('/guild/<int:guild_id>/pause', methods=['POST'])
+@guild_access_required
+def pause(guild_id):
+    vc = get_guild_voice_client(guild_id)
     if vc and vc.is_playing():
         vc.pause()
-    return redirect(url_for('index'))
-
-@app.route('/resume', methods=['POST'])
-@login_required
-def resume():
-    vc = get_active_voice_client()
+        if get_music_cog():
+            get_music_cog().publish_state(guild_id)
+    return redirect(url_for('guild_dashboard', guild_id=guild_id))
+
+@app.route('/guild/<int:guild_id>/resume', methods=['POST'])
+@guild_access_required
+def resume(guild_id):
+    vc = get_guild_voice_client(guild_id)
     if vc and vc.is_paused():
         vc.resume()
-    return redirect(url_for('index'))
+        if get_music_cog():
+            get_music_cog().publish_state(guild_id)
+    return redirect(url_for('guild_dashboard', guild_id=guild_id))
 
-@app.route('/skip', methods=['POST'])
-@login_required
-def skip():
-    vc = get_active_voice_client()
+@app.route('/guild/<int:guild_id>/skip', methods=['POST'])
+@guild_access_required
+def skip(guild_id):
+    music_cog = get_music_cog()
+    vc = get_guild_voice_client(guild_id)
     if vc and (vc.is_playing() or vc.is_paused()):
-        vc.stop() # This triggers the after_playing callback which plays next
-    return redirect(url_for('index'))
+        if music_cog and bot and bot.loop:
+            # The guild's player stops the track and moves on to the next one
+            bot.loop.call_soon_threadsafe(music_cog.skip_track, guild_id)
+        else:
+            vc.stop()
+    return redirect(url_for('guild_dashboard', guild_id=guild_id))
 
 @app.route('/health')
 
 def health_check():
 
-    return {"status": "healthy", "bot_ready": bot.is_ready() if bot else False}, 200
+    health = {"status": "healthy", "bot_ready": bot.is_ready() if bot else False}
+    # Queue depths of the blocking-work pools (yt-dlp and SQLite)
+    music_cog = get_music_cog()
+    if music_cog:
+        health["executors"] = {
+            "extraction": music_cog.extractor.stats(),
+            "database": music_cog.db.stats()
+        }
+        if music_cog.voice_workers:
+            health["voice_workers"] = music_cog.voice_workers.stats()
+    if bot and bot.is_ready():
+        health["shards"] = get_shard_stats()
+    moderation_cog = bot.get_cog('Moderation') if bot else None
+    if moderation_cog:
+        health["strikes"] = moderation_cog.strikes.stats()
+    # Extraction, audio and OAuth user cache sizes and hit rates
+    health["caches"] = get_cache_stats()
+    return health, 200
+
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/traces')
+@admin_required
+def debug_traces():
+    # Timing breakdowns of recent commands and track starts (?slow=1: only
+    # the ones over the threshold)
+    return {
+        "enabled": tracing.is_enabled(),
+        "traces": tracing.recent_traces(slow_only=request.args.get('slow') == '1'),
+    }
+
+def parse_profile_args():
+    seconds = request.args.get('seconds', 10, type=int)
+    mode = request.args.get('mode', 'sample')
+    if mode not in ('sample', 'cprofile') or not 0 < seconds <= MAX_PROFILE_SECONDS:
+        abort(400)
+    return seconds, mode
+
+def run_profile(seconds, mode):
+    # Blocking for the whole profile
+    if mode == 'sample':
+        return sample_stacks(seconds)
+    return profile_loop(bot.loop, seconds)
+
+def profile_response(report, mode):
+    filename = 'profile.folded' if mode == 'sample' else 'profile.txt'
+    return Response(report, mimetype='text/plain', headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@app.route('/debug/profile')
+@admin_required
+def debug_profile():
+    # ?seconds=10&mode=sample: folded stacks of every thread (py-spy's raw
+    # format, for flamegraph.pl or speedscope); mode=cprofile: cProfile of
+    # the bot's event loop
+    seconds, mode = parse_profile_args()
+    try:
+        report = run_profile(seconds, mode)
+    except ProfilerBusy as e:
+        return str(e), 409
+    return profile_response(report, mode)
 
 
 
@@ -349,4 +722,6 @@ def run_flask_app():
 
         from waitress import serve
 
-        serve(app, host='0.0.0.0', port=port, threads=4)
+        # send_bytes=1 flushes every event as soon as it is written; by default
+        # Waitress holds back streamed output until 18000 bytes are buffered
+        serve(app, host='0.0.0.0', port=port, threads=WEB_THREADS, send_bytes=1)
@@ -0,0 +1,222 @@
+import asyncio
+import re
+import signal
+from contextlib import contextmanager
+
+from aiohttp import web
+from flask import render_template, session
+from multidict import CIMultiDict
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+
+from . import app as flask_module
+
+flask_app = flask_module.app
+
+# Request headers EnvironBuilder derives itself
+_SKIPPED_REQUEST_HEADERS = {'host', 'content-length'}
+# Response headers aiohttp sets from the body it actually sends
+_SKIPPED_RESPONSE_HEADERS = {'content-length', 'transfer-encoding'}
+_GUILD_PATH = re.compile(r'^/guild/(\d+)/')
+
+
+@contextmanager
+def flask_request(request: web.Request, body: bytes = b''):
+    # Pushes a Flask request context for an aiohttp request, so session,
+    # flash, url_for and the templates behave exactly as under Waitress
+    builder = EnvironBuilder(
+        path=request.path,
+        base_url=f"{request.scheme}://{request.host}",
+        query_string=request.query_string,
+        method=request.method,
+        headers=[(key, value) for key, value in request.headers.items() if key.lower() not in _SKIPPED_REQUEST_HEADERS],
+        data=body,
+    )
+    try:
+        with flask_app.request_context(builder.get_environ()):
+            yield
+    finally:
+        builder.close()
+
+
+def to_aiohttp(response) -> web.Response:
+    headers = CIMultiDict(
+        (key, value) for key, value in response.headers.items() if key.lower() not in _SKIPPED_RESPONSE_HEADERS
+    )
+    return web.Response(status=response.status_code, body=response.get_data(), headers=headers)
+
+
+async def guild_allowed(request: web.Request, guild_id: int) -> bool:
+    # Makes guild_access_required's membership check here on the loop, so
+    # the Flask view finds it cached instead of waiting on this same loop
+    with flask_request(request):
+        user_id = session.get('user_id')
+    bot = flask_module.bot
+    if user_id is not None and user_id not in flask_module.ADMIN_USER_IDS and bot and bot.is_ready():
+        try:
+            await flask_module.resolve_guild_access(guild_id, user_id)
+        except Exception as e:
+            print(f"Guild access check failed: {e}")
+    with flask_request(request):
+        return flask_module.can_access_guild(guild_id)
+
+
+async def dispatch(request: web.Request) -> web.Response:
+    # Runs the regular Flask view on the event loop. Only views that never
+    # block get here; the ones that would have their own handlers below.
+    match = _GUILD_PATH.match(request.path)
+    if match:
+        await guild_allowed(request, int(match.group(1)))
+    body = await request.read()
+    with flask_request(request, body):
+        response = flask_app.full_dispatch_request()
+    return to_aiohttp(response)
+
+
+async def warm_snapshot(guild_id: int):
+    # Builds the guild's snapshot on this loop if nobody has looked at it
+    # yet, instead of the web-thread round-trip get_dashboard_context makes
+    music_cog = flask_module.get_music_cog()
+    if not music_cog:
+        return None
+    return music_cog.snapshots.get(guild_id) or await music_cog.guild_snapshot(guild_id)
+
+
+async def guild_page(request: web.Request) -> web.Response:
+    guild_id = int(request.match_info['guild_id'])
+    if not await guild_allowed(request, guild_id):
+        # The Flask view answers with the login redirect or the 403
+        return await dispatch(request)
+    snapshot = await warm_snapshot(guild_id)
+    bot = flask_module.bot
+    if snapshot is None and bot and bot.is_ready():
+        raise web.HTTPNotFound()
+    return await dispatch(request)
+
+
+async def events(request: web.Request) -> web.StreamResponse:
+    # Async version of flask_module.event_stream: an idle stream costs a
+    # parked coroutine rather than a thread, so there is no stream limit
+    guild_id = int(request.match_info['guild_id']) if 'guild_id' in request.match_info else None
+    if guild_id is not None and not await guild_allowed(request, guild_id):
+        raise web.HTTPForbidden()
+    music_cog = flask_module.get_music_cog()
+    if not music_cog:
+        return web.Response(status=503, text="Bot not active")
+    feed = music_cog.state_feed
+
+    response = web.StreamResponse(headers={
+        'Content-Type': 'text/event-stream',
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    await response.prepare(request)
+    try:
+        await response.write(b"retry: 3000\n\n")
+        version = None
+        while True:
+            if version is not None:
+                new_version = await feed.wait_async(guild_id, version, flask_module.SSE_KEEPALIVE)
+                if new_version == version:
+                    await response.write(b": keep-alive\n\n")
+                    continue
+                await asyncio.sleep(flask_module.SSE_COALESCE)
+            snapshot = await warm_snapshot(guild_id) if guild_id is not None else None
+            with flask_request(request):
+                context = flask_module.get_dashboard_context(guild_id, snapshot)
+                if guild_id is not None and context['guild'] is None and flask_module.bot.is_ready():
+                    # The bot left the guild
+                    break
+                version = context['state_version']
+                if version is None:
+                    version = feed.version(guild_id)
+                message = flask_module.sse_message('update', render_template('partials/dashboard_body.html', **context))
+            await response.write(message.encode('utf-8'))
+    except (ConnectionResetError, asyncio.CancelledError):
+        # Tab closed, or the server is shutting down
+        pass
+    return response
+
+
+async def callback(request: web.Request) -> web.Response:
+    # Same flow as flask_module.callback, with the two Discord API calls
+    # awaited instead of blocking the loop
+    with flask_request(request):
+        client_id, client_secret = flask_module.oauth_credentials()
+        if not client_id or not client_secret:
+            # Let the Flask view produce the redirect and flash message
+            return to_aiohttp(flask_app.full_dispatch_request())
+        code = request.query.get('code')
+        if not code:
+            return web.Response(status=400, text="No code provided")
+        redirect_uri = flask_module.get_redirect_uri()
+
+    oauth_client = flask_module.oauth_client
+    try:
+        tokens = await oauth_client.exchange_code_async(client_id, client_secret, code, redirect_uri)
+        user_data = await oauth_client.get_user_async(tokens['access_token'])
+    except Exception as e:
+        print(f"OAuth Error: {e}")
+        return web.Response(status=500, text=f"Authentication failed: {e}")
+
+    with flask_request(request):
+        response = flask_module.finish_login(user_data)
+        # Writes the updated session cookie
+        response = flask_app.process_response(response)
+    return to_aiohttp(response)
+
+
+async def debug_profile(request: web.Request) -> web.Response:
+    # The profile runs in a thread; the Flask view would block this loop
+    # for its whole duration (and cProfile of the loop would never start)
+    with flask_request(request):
+        try:
+            flask_module.admin_required(lambda: None)()
+            seconds, mode = flask_module.parse_profile_args()
+        except HTTPException as e:
+            return to_aiohttp(e.get_response())
+    try:
+        report = await asyncio.to_thread(flask_module.run_profile, seconds, mode)
+    except flask_module.ProfilerBusy as e:
+        return web.Response(status=409, text=str(e))
+    with flask_request(request):
+        return to_aiohttp(flask_module.profile_response(report, mode))
+
+
+def create_app() -> web.Application:
+    web_app = web.Application()
+    web_app.router.add_static('/static', flask_app.static_folder)
+    web_app.router.add_get('/events', events)
+    web_app.router.add_get('/guild/{guild_id:\\d+}/events', events)
+    web_app.router.add_get('/guild/{guild_id:\\d+}/', guild_page)
+    web_app.router.add_get('/guild/{guild_id:\\d+}/partial', guild_page)
+    web_app.router.add_get('/callback', callback)
+    web_app.router.add_get('/debug/profile', debug_profile)
+    # Everything else is served by the Flask views as they are
+    web_app.router.add_route('*', '/{tail:.*}', dispatch)
+    return web_app
+
+
+async def run_with_bot(bot, token, port):
+    # Serves the dashboard on the bot's own event loop, then runs the bot
+    runner = web.AppRunner(create_app())
+    await runner.setup()
+    await web.TCPSite(runner, '0.0.0.0', port).start()
+    print(f" * Web Dashboard: Running in ASYNC mode (aiohttp) on port {port}")
+    if token:
+        try:
+            # `docker stop` sends SIGTERM; close the bot (unloading the cogs,
+            # which flush their stores) the same way Ctrl+C does
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(bot.close()))
+        except NotImplementedError:
+            # Windows
+            pass
+    try:
+        if token:
+            async with bot:
+                await bot.start(token)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await flask_module.oauth_client.close_async()